@@ -0,0 +1,96 @@
+"""One frame timer for every delayed canvas update of the game window."""
+import heapq
+import itertools
+import time
+
+FRAME_MS = 16  # about 60 frames per second
+
+
+class Animator:
+    """Timeline of canvas updates run by a single after() loop, which only runs while there is work.
+
+    Updates are scheduled in batches: begin() starts a batch no earlier than the end of the previous one, so the
+    animations of consecutive moves never interleave, however quickly the moves come. Within a frame only the
+    last update of the same (canvas, item, option) key is applied, and a new move of an item replaces its
+    running move.
+    """
+
+    def __init__(self, master, frame_ms=FRAME_MS):
+        self.master = master
+        self.frame_ms = frame_ms
+        self.events = []  # heap of (due time, sequence, key, function)
+        self.tweens = {}  # (canvas, item) -> [start time, end time, start xy or None, target xy]
+        self.sequence = itertools.count()
+        self.origin = 0.0  # start of the current batch, in ms
+        self.end = 0.0  # end of the last scheduled update
+        self.timer = None
+
+    @staticmethod
+    def now():
+        return time.perf_counter() * 1000.0
+
+    def begin(self):
+        """Starts a batch, its delays count from the end of the updates scheduled so far."""
+        self.origin = max(self.now(), self.end)
+        return self.origin
+
+    def schedule(self, delay, function, key=None):
+        due = self.origin + delay
+        self.end = max(self.end, due)
+        heapq.heappush(self.events, (due, next(self.sequence), key, function))
+        self.start_timer()
+
+    def configure(self, canvas, item, delay, **options):
+        """itemconfigure after delay ms of the batch, coalesced with other updates of the same options."""
+        for name, value in options.items():
+            self.schedule(delay, lambda name=name, value=value: canvas.itemconfigure(item, **{name: value}),
+                          (canvas, item, name))
+
+    def move(self, canvas, item, xy, delay, duration):
+        """Slides item to the canvas coordinates xy, starting after delay ms of the batch."""
+        start = self.origin + delay
+        self.end = max(self.end, start + duration)
+        self.schedule(delay, lambda: self.tweens.__setitem__((canvas, item), [start, start + duration, None, xy]),
+                      (canvas, item, 'coords'))
+
+    def busy(self):
+        return bool(self.events or self.tweens)
+
+    def finish(self):
+        """Applies every pending update at once and ends the moves at their targets."""
+        if self.timer is not None:
+            self.master.after_cancel(self.timer)
+            self.timer = None
+        while self.events:
+            function = heapq.heappop(self.events)[3]
+            function()
+        for (canvas, item), tween in self.tweens.items():
+            canvas.coords(item, *tween[3])
+        self.tweens = {}
+        self.origin = self.end = 0.0
+
+    def start_timer(self):
+        if self.timer is None:
+            self.timer = self.master.after(self.frame_ms, self.tick)
+
+    def tick(self):
+        self.timer = None
+        now = self.now()
+        due = {}  # the last update of every key, in schedule order
+        while self.events and self.events[0][0] <= now:
+            _, sequence, key, function = heapq.heappop(self.events)
+            due.pop(key if key is not None else sequence, None)
+            due[key if key is not None else sequence] = function
+        for function in due.values():
+            function()
+        for (canvas, item), tween in list(self.tweens.items()):
+            start, end, start_xy, xy = tween
+            if start_xy is None:
+                start_xy = tween[2] = canvas.coords(item)[:2] or xy
+            progress = 1.0 if end <= start else min(max((now - start) / (end - start), 0.0), 1.0)
+            canvas.coords(item, start_xy[0] + (xy[0] - start_xy[0]) * progress,
+                          start_xy[1] + (xy[1] - start_xy[1]) * progress)
+            if progress >= 1.0:
+                del self.tweens[(canvas, item)]
+        if self.busy():
+            self.start_timer()
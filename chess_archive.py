@@ -0,0 +1,253 @@
+"""Packed binary game archive, read through mmap so any game and ply is reached without parsing the others.
+
+    python chess_archive.py games.pgn games.gma     appends the games of a PGN database to an archive
+    python chess_archive.py games.gma --game 12     prints a game of an archive as PGN
+
+Layout, little endian: a 20 byte header (magic, number of games u32, offset of the last index block u64), then
+game records and index blocks. An index block is the offset of the block before it (u64, 0 for the first), the
+number of its games (u32) and their record offsets (u64 each). A record is the result (u8), the lengths of its
+start FEN (0 for the initial position) and of the names of the white and black players (u8 each), the FEN, the
+names in UTF-8, the number of moves (u16) and the moves in 16 bits each, encoded as in chess_movegen.
+
+Nothing written is ever overwritten but the header: new records and their index block go to the end of the file,
+then the header is pointed at the block. A writer that is killed loses the games after its last commit only.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from chess_position import Position, START_FEN
+from chess_pgn import parse_san, pgn_text, san, read_games, movetext_tokens, RESULTS
+
+MAGIC = b'GMFARCH3'  # version 2 added the player names, version 3 the chained index blocks
+HEADER = struct.Struct('<8sIQ')
+BLOCK = struct.Struct('<QI')  # offset of the previous index block, number of games in this one
+RECORD = struct.Struct('<BBBB')  # result, lengths of the start FEN and of the white and black names
+ARCHIVE_EXTENSION = '.gma'
+
+
+class ArchiveWriter:
+    """Appends games to an archive, a new one if the file does not exist.
+
+    The games are committed, their index block written and the header updated, every commit_every games and
+    by close().
+    """
+
+    def __init__(self, path, commit_every=64):
+        self.commit_every = commit_every
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, 'r+b')
+            self.count, self.index_at = read_header(self.file.read(HEADER.size), os.path.getsize(path), path)
+            self.file.seek(0, os.SEEK_END)  # after the records of a writer killed before its commit, if any
+        else:
+            self.file = open(path, 'w+b')
+            self.count, self.index_at = 0, 0
+            self.file.write(HEADER.pack(MAGIC, 0, 0))
+        self.pending = []  # offsets of the records not committed yet
+
+    def add(self, moves, result='*', start_fen=START_FEN, white='?', black='?'):
+        """Appends a game, the names of its players are cut to 255 bytes."""
+        fen = b'' if start_fen == START_FEN else start_fen.encode('ascii')
+        white, black = white.encode('utf-8')[:255], black.encode('utf-8')[:255]
+        self.pending.append(self.file.tell())
+        self.file.write(RECORD.pack(RESULTS.index(result), len(fen), len(white), len(black)) + fen + white + black)
+        self.file.write(struct.pack(f'<H{len(moves)}H', len(moves), *moves))
+        if len(self.pending) >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        """Makes the games added so far part of the archive on disk."""
+        if not self.pending:
+            return
+        block_at = self.file.tell()
+        self.file.write(BLOCK.pack(self.index_at, len(self.pending)))
+        self.file.write(struct.pack(f'<{len(self.pending)}Q', *self.pending))
+        self.file.flush()  # the block is on disk before the header points at it
+        self.count += len(self.pending)
+        self.index_at = block_at
+        self.pending = []
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.count, self.index_at))
+        self.file.flush()
+        self.file.seek(0, os.SEEK_END)
+
+    def close(self):
+        self.commit()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_header(data, size, path):
+    """Number of games and offset of the last index block of an archive header, ValueError if it is not one."""
+    magic, count, index_at = HEADER.unpack(data[:HEADER.size].ljust(HEADER.size, b'\0'))
+    if magic != MAGIC or (index_at == 0) != (count == 0) or \
+            (index_at and not HEADER.size <= index_at <= size - BLOCK.size):
+        raise ValueError(f'{path} is not a game archive')
+    return count, index_at
+
+
+class GameArchive:
+    """Read only view of an archive. Games are numbered from 1, like the games of a PGN file."""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file can't be mapped
+            self.file.close()
+            raise ValueError(f'{path} is not a game archive')
+        self.path = path
+        try:
+            self.count, index_at = read_header(self.data, len(self.data), path)
+            self.offsets = self.read_index(index_at)
+        except ValueError:
+            self.close()
+            raise
+
+    def read_index(self, index_at):
+        """Record offsets of the games, gathered from the index blocks, the last block first."""
+        blocks = []
+        total = 0
+        while index_at:
+            previous, count = BLOCK.unpack_from(self.data, index_at)
+            total += count
+            if previous >= index_at or (previous and previous < HEADER.size) or total > self.count or \
+                    index_at + BLOCK.size + 8 * count > len(self.data):
+                raise ValueError(f'{self.path} is not a game archive')
+            blocks.append(struct.unpack_from(f'<{count}Q', self.data, index_at + BLOCK.size))
+            index_at = previous  # before this block, so its header fits in the file too
+        if total != self.count:
+            raise ValueError(f'{self.path} is not a game archive')
+        return [offset for block in reversed(blocks) for offset in block]
+
+    def __len__(self):
+        return self.count
+
+    def record(self, number):
+        """Offset of the moves, their number, the result, the start FEN and the white and black players of a game.
+
+        Raises IndexError for a missing game, ValueError if the record does not fit in the file.
+        """
+        if not 1 <= number <= self.count:
+            raise IndexError(f'the archive has no game {number}')
+        offset = self.offsets[number - 1]
+        if not HEADER.size <= offset <= len(self.data) - RECORD.size:
+            raise ValueError(f'game {number} of {self.path} is corrupted')
+        result, fen_length, white_length, black_length = RECORD.unpack_from(self.data, offset)
+        offset += RECORD.size
+        if result >= len(RESULTS) or offset + fen_length + white_length + black_length + 2 > len(self.data):
+            raise ValueError(f'game {number} of {self.path} is corrupted')
+        start_fen = self.data[offset:offset + fen_length].decode('ascii') if fen_length else START_FEN
+        offset += fen_length
+        white = self.data[offset:offset + white_length].decode('utf-8', errors='replace')
+        offset += white_length
+        black = self.data[offset:offset + black_length].decode('utf-8', errors='replace')
+        offset += black_length
+        count = struct.unpack_from('<H', self.data, offset)[0]
+        if offset + 2 + 2 * count > len(self.data):
+            raise ValueError(f'game {number} of {self.path} is corrupted')
+        return offset + 2, count, RESULTS[result], start_fen, white, black
+
+    def game(self, number, ply=None):
+        """Start FEN, result and the first ply moves (all if None) of a game."""
+        offset, count, result, start_fen, _, _ = self.record(number)
+        count = count if ply is None else min(ply, count)
+        return start_fen, result, list(struct.unpack_from(f'<{count}H', self.data, offset))
+
+    def players(self, number):
+        """Names of the white and black players of a game."""
+        return self.record(number)[4:]
+
+    def move(self, number, ply):
+        """Move number ply (from 0) of a game."""
+        offset, count = self.record(number)[:2]
+        if not 0 <= ply < count:
+            raise IndexError(f'game {number} has no ply {ply}')
+        return struct.unpack_from('<H', self.data, offset + 2 * ply)[0]
+
+    def close(self):
+        if getattr(self, 'data', None) is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def database_games(path):
+    """Generates (start FEN, result, moves, (white, black)) for every game of a PGN file or an archive, reading one
+    game at a time.
+
+    The moves of a PGN game with an unreadable or illegal move are given as the error instead of a list.
+    """
+    if path.lower().endswith(ARCHIVE_EXTENSION):
+        with GameArchive(path) as archive:
+            for number in range(1, len(archive) + 1):
+                start_fen, result, moves = archive.game(number)
+                yield start_fen, result, moves, archive.players(number)
+        return
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        for headers, movetext in read_games(file):
+            start_fen = headers.get('FEN', START_FEN)
+            result = headers.get('Result', '*')
+            try:
+                position = Position.from_fen(start_fen)
+                moves = []
+                for text in movetext_tokens(movetext):
+                    moves.append(parse_san(position, text))
+                    position.make_move(moves[-1])
+            except (ValueError, IndexError, KeyError) as error:
+                moves = error
+            players = headers.get('White', '?'), headers.get('Black', '?')
+            yield start_fen, result if result in RESULTS else '*', moves, players
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert PGN databases to game archives, or show archived games.')
+    parser.add_argument('source', help='PGN file to convert, or archive to read')
+    parser.add_argument('archive', nargs='?', help='archive the PGN games are appended to')
+    parser.add_argument('--game', type=int, default=1, help='game of the archive to print (default 1)')
+    args = parser.parse_args(argv)
+
+    if args.archive:
+        added = skipped = 0
+        with ArchiveWriter(args.archive) as writer:
+            for number, (start_fen, result, moves, (white, black)) in enumerate(database_games(args.source), 1):
+                if isinstance(moves, Exception):
+                    print(f'game {number} skipped: {moves}')
+                    skipped += 1
+                else:
+                    writer.add(moves, result, start_fen, white, black)
+                    added += 1
+        print(f'{added} games added to {args.archive}, {skipped} skipped')
+        return 0 if added or not skipped else 1
+
+    with GameArchive(args.source) as archive:
+        start_fen, result, moves = archive.game(args.game)
+        white, black = archive.players(args.game)
+    position = Position.from_fen(start_fen)
+    sans = []
+    for move in moves:
+        sans.append(san(position, move))
+        position.make_move(move)
+    headers = {'Event': f'{os.path.basename(args.source)} game {args.game}', 'White': white, 'Black': black,
+               'Result': result}
+    if start_fen != START_FEN:
+        headers.update({'SetUp': '1', 'FEN': start_fen})
+    fields = start_fen.split()
+    print(pgn_text(headers, sans, result, int(fields[5]) if len(fields) > 5 else 1, fields[1] == 'b'), end='')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Think time benchmark of the computer player over a corpus of positions, without tkinter.
+
+    python chess_benchmark.py                               built-in corpus, 20000 nodes per move
+    python chess_benchmark.py --time 1.0 saved_game.txt     time limited, on saved games
+    python chess_benchmark.py --json results.json           also writes the results for diffing versions
+
+With a node limit and one worker the engine visits exactly the same tree on every run, so the chosen moves and
+depths must match between runs and only the times change.
+The endgame tables are only probed with --bitbases, so the results do not depend on whether they were generated.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from chess_position import Position
+from chess_movegen import MOVE_CACHE, move_name
+from chess_engine import Engine
+from chess_parallel import ParallelEngine
+from chess_perft import REFERENCE_POSITIONS, setup_position
+
+CORPUS = [REFERENCE_POSITIONS[name][0] for name in ('start', 'kiwipete', 'position3', 'position4', 'position5',
+                                                     'position6', 'castling_prevented', 'discovered_check')] + [
+    'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4',  # mate in one
+    'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP1B1PPP/R2QKB1R w KQ - 0 8',
+    '2r2rk1/1bqnbppp/p2ppn2/1p6/3NP3/1BN1BP2/PPPQ2PP/2KR3R w - - 0 13',
+    'r3r1k1/pp3pbp/1qp3p1/2B5/2BP2b1/Q1n2N2/P4PPP/3R1K1R b - - 0 17',
+    '8/8/3k4/3p4/3P4/3K4/8/8 w - - 0 1',
+    '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',  # back rank mate
+    '8/5k2/8/8/8/8/1K3Q2/8 w - - 0 1',
+    '4k3/8/8/8/8/8/4P3/4K3 w - - 0 1',
+]
+
+
+def percentile(values, p):
+    """Nearest rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    index = max(int(len(values) * p / 100.0 + 0.999999) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def load_corpus(paths):
+    """Positions of the given files: save files of the game, or text files with one FEN per line."""
+    if not paths:
+        return [(fen, Position.from_fen(fen)) for fen in CORPUS]
+    corpus = []
+    for path in paths:
+        with open(path, 'r') as file:
+            first_line = file.readline()
+        if '=' in first_line:  # a save file of the game, its header or the 'a8=bT' lines of the legacy format
+            corpus.append((path, setup_position(path)))
+            continue
+        with open(path, 'r') as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    corpus.append((line, Position.from_fen(line)))
+    return corpus
+
+
+def move_source(position, result):
+    """'search', 'table' for a move of an endgame table, or 'forced' when the position has at most one move."""
+    if result.nodes:
+        return 'search'
+    return 'forced' if len(MOVE_CACHE.moves(position)) <= 1 else 'table'
+
+
+def run_benchmark(corpus, time_limit, node_limit, workers=1, hash_mb=16, repeat=1, bitbases=False):
+    """Searches every position of the corpus repeat times and returns the results as a dictionary."""
+    if workers > 1:
+        engine = ParallelEngine(workers=workers, time_limit=time_limit, hash_mb=hash_mb, node_limit=node_limit,
+                                bitbases=bitbases)
+    else:
+        engine = Engine(time_limit=time_limit, node_limit=node_limit, hash_mb=hash_mb, bitbases=bitbases)
+    moves = []
+    try:
+        for _ in range(repeat):
+            for name, position in corpus:
+                engine.tt.clear()  # every position starts from the same state
+                start = time.perf_counter()
+                result = engine.search(position.copy())
+                seconds = time.perf_counter() - start
+                moves.append({'position': name, 'move': move_name(result.move) if result.move else None,
+                              'source': move_source(position, result), 'score': result.score, 'depth': result.depth,
+                              'nodes': result.nodes, 'seconds': round(seconds, 6)})
+    finally:
+        if workers > 1:
+            engine.close()
+    times = sorted(move['seconds'] for move in moves)
+    nodes = sum(move['nodes'] for move in moves)
+    return {
+        'settings': {'time_limit': time_limit, 'node_limit': node_limit, 'workers': workers, 'hash_mb': hash_mb,
+                     'repeat': repeat, 'bitbases': bitbases},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform()},
+        'summary': {'positions': len(moves), 'p50': percentile(times, 50), 'p95': percentile(times, 95),
+                    'p99': percentile(times, 99), 'max': times[-1] if times else 0.0,
+                    'nodes_per_second': round(nodes / sum(times)) if sum(times) else 0},
+        'moves': moves,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure how long the computer player thinks per move.')
+    parser.add_argument('files', nargs='*', help='save files or FEN files (default: built-in corpus)')
+    parser.add_argument('--nodes', type=int, default=20000, help='node limit per move, 0 for none (default 20000)')
+    parser.add_argument('--time', type=float, default=60.0, help='time limit per move in seconds (default 60)')
+    parser.add_argument('--workers', type=int, default=1, help='processes of the parallel search (default 1)')
+    parser.add_argument('--hash', type=int, default=16, help='hash table size in MB (default 16)')
+    parser.add_argument('--repeat', type=int, default=1, help='searches per position (default 1)')
+    parser.add_argument('--bitbases', action='store_true', help='play the moves of the endgame tables, if generated')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(load_corpus(args.files), args.time, args.nodes, args.workers, args.hash, args.repeat,
+                            args.bitbases)
+    for move in results['moves']:
+        print(f"{move['seconds']:8.3f}s  depth {move['depth']:2}  {move['nodes']:>8} nodes  "
+              f"{str(move['move']):6} {move['source']:7} {move['position']}")
+    summary = results['summary']
+    print(f"{summary['positions']} moves: p50 {summary['p50']:.3f}s  p95 {summary['p95']:.3f}s  "
+          f"p99 {summary['p99']:.3f}s  max {summary['max']:.3f}s  {summary['nodes_per_second']} nodes/s")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=1)
+        print('Results written to ' + args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""Endgame tables of king and queen, rook or pawn against king, generated by retrograde analysis.
+
+    python chess_bitbase.py    generates the missing tables into bitbases/, once, in about 12 seconds
+
+A table has one byte per position, indexed by side to move, strong king, weak king and piece, with the strong side
+as white; positions of a strong black side are mirrored. 0 is a draw (or an illegal position), n > 0 a win in
+n - 1 plies with white to move, or a loss in n - 1 plies with black to move. The plies count to mate, in KPK to
+the promotion into a won KQK or KRK position. A byte rather than a bit per position keeps that distance, without
+it the winning side could not make progress. The files are memory-mapped, a probe reads one byte.
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from chess_bitboard import KING_ATTACKS, PAWN_ATTACKS, rook_attacks_from, bishop_attacks_from, popcount, squares
+from chess_position import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK
+from chess_movegen import legal_moves
+
+TABLE_DIRECTORY = 'bitbases'
+TABLE_NAMES = {QUEEN: 'KQK', ROOK: 'KRK', PAWN: 'KPK'}  # generated in this order, KPK promotes into the others
+TABLE_SIZE = 2 * 64 * 64 * 64
+
+
+def table_index(side, strong_king, weak_king, piece):
+    return ((side << 6 | strong_king) << 6 | weak_king) << 6 | piece
+
+
+def piece_attacks(kind, ps, occupied):  # of the white piece
+    if kind == PAWN:
+        return PAWN_ATTACKS[WHITE][ps]
+    if kind == ROOK:
+        return rook_attacks_from(ps, occupied)
+    return rook_attacks_from(ps, occupied) | bishop_attacks_from(ps, occupied)
+
+
+def generate(kind, tables):
+    """Values of the table of kind, see the module docstring. tables holds the values of the tables generated so far.
+
+    Black to move positions count their king moves; a position is lost when every move leads to a won white to
+    move position. Won and lost positions are found ply by ply, going backwards from the mates (and for KPK from
+    the winning promotions) with un-moves.
+    """
+    values = bytearray(TABLE_SIZE)
+    legal = bytearray(TABLE_SIZE)
+    counts = bytearray(TABLE_SIZE)  # moves of black not known to lose yet
+    frontier = []  # positions decided at the current ply
+    promotions = []  # white to move positions won by promoting, decided at ply 1
+    for wk in range(64):
+        for bk in range(64):
+            if bk == wk or KING_ATTACKS[wk] >> bk & 1:
+                continue
+            for ps in range(64):
+                if ps == wk or ps == bk or (kind == PAWN and not 8 <= ps < 56):
+                    continue
+                # the black king does not block the ray it escapes along
+                attacks = KING_ATTACKS[wk] | piece_attacks(kind, ps, 1 << wk | 1 << ps)
+                if not attacks >> bk & 1:  # white to move, black is not in check
+                    i = table_index(WHITE, wk, bk, ps)
+                    legal[i] = 1
+                    if kind == PAWN and ps >= 48 and ps + 8 not in (wk, bk) and (
+                            tables[QUEEN][table_index(BLACK, wk, bk, ps + 8)] or
+                            tables[ROOK][table_index(BLACK, wk, bk, ps + 8)]):
+                        values[i] = 2
+                        promotions.append(i)
+                i = table_index(BLACK, wk, bk, ps)
+                legal[i] = 1
+                counts[i] = popcount(KING_ATTACKS[bk] & ~attacks & ~(1 << wk))  # a capture leads to a draw
+                if not counts[i] and attacks >> bk & 1:  # mate
+                    values[i] = 1
+                    frontier.append(i)
+    ply = 0
+    while frontier or promotions:
+        decided = []
+        for i in frontier:
+            ps, bk, wk, side = i & 63, i >> 6 & 63, i >> 12 & 63, i >> 18
+            if side == BLACK:  # lost, every white move to it wins
+                occupied = 1 << wk | 1 << bk | 1 << ps
+                origins = [table_index(WHITE, king, bk, ps) for king in squares(KING_ATTACKS[wk] & ~occupied)]
+                if kind == PAWN:
+                    if ps >= 16 and not occupied >> (ps - 8) & 1:
+                        origins.append(table_index(WHITE, wk, bk, ps - 8))
+                        if 24 <= ps < 32 and not occupied >> (ps - 16) & 1:
+                            origins.append(table_index(WHITE, wk, bk, ps - 16))
+                else:
+                    for piece in squares(piece_attacks(kind, ps, occupied) & ~occupied):  # slides are reversible
+                        origins.append(table_index(WHITE, wk, bk, piece))
+                for j in origins:
+                    if legal[j] and not values[j]:
+                        values[j] = ply + 2
+                        decided.append(j)
+            else:  # won, the black move to it is one less way out
+                for king in squares(KING_ATTACKS[bk] & ~(1 << ps | 1 << wk | KING_ATTACKS[wk])):
+                    j = table_index(BLACK, wk, king, ps)
+                    if not values[j]:
+                        counts[j] -= 1
+                        if not counts[j]:
+                            values[j] = ply + 2
+                            decided.append(j)
+        ply += 1
+        if ply == 1:
+            decided += promotions
+            promotions = []
+        frontier = decided
+    return values
+
+
+class Bitbase:
+    """Read only table file, mapped into memory."""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if os.fstat(self.file.fileno()).st_size != TABLE_SIZE:
+            self.file.close()
+            raise ValueError(f'{path} is not an endgame table')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+RETRY_SECONDS = 10.0  # how often a missing table is looked for again, it may have been generated meanwhile
+_tables = {}  # kind -> Bitbase, opened on the first probe of its ending
+_retry_at = {}  # kind -> time.monotonic() from which a missing table is looked for again
+
+
+def table_path(kind):
+    return os.path.join(TABLE_DIRECTORY, TABLE_NAMES[kind] + '.bin')
+
+
+def open_table(kind):
+    """Bitbase of kind, None while the table has not been generated."""
+    table = _tables.get(kind)
+    if table is None and time.monotonic() >= _retry_at.get(kind, 0.0):
+        try:
+            table = _tables[kind] = Bitbase(table_path(kind))
+        except (OSError, ValueError):
+            _retry_at[kind] = time.monotonic() + RETRY_SECONDS  # the engine searches this ending meanwhile
+    return table
+
+
+def probe(position):
+    """(result, plies) of a position of two kings and at most one more piece, for the side to move: result is 1 for
+    a win, -1 for a loss and 0 for a draw. None for other positions, or when the table is missing.
+    """
+    occupied = position.occupied[WHITE] | position.occupied[BLACK]
+    rest = occupied & (occupied - 1)
+    rest &= rest - 1  # what is left after two pieces
+    if rest & (rest - 1):
+        return None
+    if not rest:
+        return 0, 0  # two kings
+    board = position.board
+    for ps in squares(occupied):
+        if board[ps] & 7 != KING:
+            break
+    kind, strong = board[ps] & 7, board[ps] >> 3
+    if kind in (KNIGHT, BISHOP):
+        return 0, 0
+    table = open_table(kind)
+    if table is None:
+        return None
+    wk, bk = position.king_square(strong), position.king_square(strong ^ 1)
+    if strong == BLACK:
+        wk, bk, ps = wk ^ 56, bk ^ 56, ps ^ 56
+    side = position.side ^ strong
+    value = table[table_index(side, wk, bk, ps)]
+    if not value:
+        return 0, 0
+    return (1 if side == WHITE else -1), value - 1
+
+
+def best_move(position):
+    """Move keeping the result of the table (the quickest win, any draw or the slowest loss) and the probe of the
+    position; 0 and None if the position has no table.
+    """
+    probed = probe(position)
+    if probed is None:
+        return 0, None
+    board = position.board
+    best, best_key = 0, None
+    for move in legal_moves(position):
+        converted = board[move >> 6 & 63] != EMPTY or move >> 12  # captures and promotions leave this table
+        position.make_move(move)
+        child = probe(position)
+        position.unmake_move(move)
+        if child is None:
+            return 0, None
+        result, plies = -child[0], child[1]
+        key = (result, bool(converted), -plies) if result > 0 else (result, False, plies)  # a win converts first
+        if best_key is None or key > best_key:
+            best, best_key = move, key
+    return best, probed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the KQK, KRK and KPK endgame tables.')
+    parser.add_argument('--force', action='store_true', help='generate tables that exist already')
+    args = parser.parse_args(argv)
+
+    os.makedirs(TABLE_DIRECTORY, exist_ok=True)
+    tables = {}
+    for kind, name in TABLE_NAMES.items():
+        path = table_path(kind)
+        if os.path.exists(path) and not args.force:
+            with open(path, 'rb') as file:
+                tables[kind] = file.read()
+            print(f'{path} exists')
+            continue
+        start = time.perf_counter()
+        tables[kind] = values = generate(kind, tables)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(values)
+        os.replace(path + '.tmp', path)  # a half written table is never used
+        wins = sum(1 for value in values[:TABLE_SIZE // 2] if value)
+        print(f'{path}: {wins} won positions with the {name[1]} side to move, longest win {max(values) - 1} plies, '
+              f'{time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""64 bit board sets (bit n = square n, a1=0) with attack tables and Kogge-Stone sliding attacks."""
+
+FULL = 0xffffffffffffffff
+NOT_A_FILE = 0xfefefefefefefefe
+NOT_H_FILE = 0x7f7f7f7f7f7f7f7f
+RANK_1 = 0xff
+RANK_8 = 0xff << 56
+
+
+def lsb(bb):  # index of the lowest set bit
+    return (bb & -bb).bit_length() - 1
+
+
+def squares(bb):  # indexes of all set bits, lowest first
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def _step_table(steps):
+    table = []
+    for sq in range(64):
+        f, r = sq % 8, sq // 8
+        bb = 0
+        for df, dr in steps:
+            if 0 <= f + df < 8 and 0 <= r + dr < 8:
+                bb |= 1 << ((r + dr) * 8 + f + df)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table([(1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2)])
+KING_ATTACKS = _step_table([(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)])
+PAWN_ATTACKS = [_step_table([(-1, 1), (1, 1)]), _step_table([(-1, -1), (1, -1)])]  # by pawn color and square
+
+
+# Kogge-Stone occluded fills: gen is the set of sliders, pro the empty squares they may pass
+def _north(gen, pro):
+    gen |= pro & (gen << 8)
+    pro &= pro << 8
+    gen |= pro & (gen << 16)
+    pro &= pro << 16
+    gen |= pro & (gen << 32)
+    return (gen << 8) & FULL
+
+
+def _south(gen, pro):
+    gen |= pro & (gen >> 8)
+    pro &= pro >> 8
+    gen |= pro & (gen >> 16)
+    pro &= pro >> 16
+    gen |= pro & (gen >> 32)
+    return gen >> 8
+
+
+def _east(gen, pro):
+    pro &= NOT_A_FILE
+    gen |= pro & (gen << 1)
+    pro &= pro << 1
+    gen |= pro & (gen << 2)
+    pro &= pro << 2
+    gen |= pro & (gen << 4)
+    return (gen << 1) & NOT_A_FILE & FULL
+
+
+def _west(gen, pro):
+    pro &= NOT_H_FILE
+    gen |= pro & (gen >> 1)
+    pro &= pro >> 1
+    gen |= pro & (gen >> 2)
+    pro &= pro >> 2
+    gen |= pro & (gen >> 4)
+    return (gen >> 1) & NOT_H_FILE
+
+
+def _north_east(gen, pro):
+    pro &= NOT_A_FILE
+    gen |= pro & (gen << 9)
+    pro &= pro << 9
+    gen |= pro & (gen << 18)
+    pro &= pro << 18
+    gen |= pro & (gen << 36)
+    return (gen << 9) & NOT_A_FILE & FULL
+
+
+def _north_west(gen, pro):
+    pro &= NOT_H_FILE
+    gen |= pro & (gen << 7)
+    pro &= pro << 7
+    gen |= pro & (gen << 14)
+    pro &= pro << 14
+    gen |= pro & (gen << 28)
+    return (gen << 7) & NOT_H_FILE & FULL
+
+
+def _south_east(gen, pro):
+    pro &= NOT_A_FILE
+    gen |= pro & (gen >> 7)
+    pro &= pro >> 7
+    gen |= pro & (gen >> 14)
+    pro &= pro >> 14
+    gen |= pro & (gen >> 28)
+    return (gen >> 7) & NOT_A_FILE
+
+
+def _south_west(gen, pro):
+    pro &= NOT_H_FILE
+    gen |= pro & (gen >> 9)
+    pro &= pro >> 9
+    gen |= pro & (gen >> 18)
+    pro &= pro >> 18
+    gen |= pro & (gen >> 36)
+    return (gen >> 9) & NOT_H_FILE
+
+
+def rook_attacks(sliders, occupied):
+    """Squares attacked along ranks and files by the set of sliders, blocked by occupied squares."""
+    empty = ~occupied & FULL
+    return _north(sliders, empty) | _south(sliders, empty) | _east(sliders, empty) | _west(sliders, empty)
+
+
+def bishop_attacks(sliders, occupied):
+    """Squares attacked along diagonals by the set of sliders, blocked by occupied squares."""
+    empty = ~occupied & FULL
+    return _north_east(sliders, empty) | _north_west(sliders, empty) | \
+        _south_east(sliders, empty) | _south_west(sliders, empty)
+
+
+def _relevant_mask(attacks, sq):  # blockers on the edge of the board never change the attack set
+    f, r = sq % 8, sq // 8
+    edges = 0
+    if f != 0:
+        edges |= 0x0101010101010101
+    if f != 7:
+        edges |= 0x0101010101010101 << 7
+    if r != 0:
+        edges |= RANK_1
+    if r != 7:
+        edges |= RANK_8
+    return attacks & ~edges & FULL
+
+
+ROOK_MASKS = [_relevant_mask(rook_attacks(1 << sq, 0), sq) for sq in range(64)]
+BISHOP_MASKS = [_relevant_mask(bishop_attacks(1 << sq, 0), sq) for sq in range(64)]
+# attack sets of a single slider keyed by the relevant blockers, filled on first use (at most 102400 + 5248 sets)
+_ROOK_TABLE = [{} for _ in range(64)]
+_BISHOP_TABLE = [{} for _ in range(64)]
+
+
+def rook_attacks_from(sq, occupied):
+    """Rook attacks from one square: a table lookup once the blocker pattern has been seen."""
+    blockers = occupied & ROOK_MASKS[sq]
+    try:
+        return _ROOK_TABLE[sq][blockers]
+    except KeyError:
+        attacks = _ROOK_TABLE[sq][blockers] = rook_attacks(1 << sq, blockers)
+        return attacks
+
+
+def bishop_attacks_from(sq, occupied):
+    """Bishop attacks from one square: a table lookup once the blocker pattern has been seen."""
+    blockers = occupied & BISHOP_MASKS[sq]
+    try:
+        return _BISHOP_TABLE[sq][blockers]
+    except KeyError:
+        attacks = _BISHOP_TABLE[sq][blockers] = bishop_attacks(1 << sq, blockers)
+        return attacks
@@ -0,0 +1,356 @@
+"""Computer player: negamax alpha-beta search with iterative deepening and quiescence search."""
+import time
+from collections import namedtuple
+from chess_bitboard import squares
+from chess_position import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY, WHITE, BLACK, make_piece
+from chess_movegen import legal_moves, is_legal, MOVE_CACHE
+from chess_transposition import (TranspositionTable, EXACT, LOWER, UPPER, entry_move, entry_score, entry_depth,
+                                 entry_bound)
+from chess_bitbase import probe, best_move as bitbase_move
+
+MATE = 30000
+MAX_DEPTH = 64
+BITBASE_WIN = 20000  # score of a won table position less its distance, above any material and below the mates
+WIN_SCORE = BITBASE_WIN - 256  # mates and table wins from here up, their scores count the plies from the root
+PIECE_VALUES = [0, 100, 320, 330, 500, 900, 0]
+PHASE_WEIGHTS = [0, 0, 1, 1, 2, 4, 0]  # 24 with all pieces on the board, 0 in a pawn ending
+MOBILITY_WEIGHT = 2  # centipawns per attacked square
+
+# piece-square tables as seen from white, written with rank 8 at the top
+_PST_RANK8_FIRST = {
+    PAWN: [0, 0, 0, 0, 0, 0, 0, 0,
+           50, 50, 50, 50, 50, 50, 50, 50,
+           10, 10, 20, 30, 30, 20, 10, 10,
+           5, 5, 10, 25, 25, 10, 5, 5,
+           0, 0, 0, 20, 20, 0, 0, 0,
+           5, -5, -10, 0, 0, -10, -5, 5,
+           5, 10, 10, -20, -20, 10, 10, 5,
+           0, 0, 0, 0, 0, 0, 0, 0],
+    KNIGHT: [-50, -40, -30, -30, -30, -30, -40, -50,
+             -40, -20, 0, 0, 0, 0, -20, -40,
+             -30, 0, 10, 15, 15, 10, 0, -30,
+             -30, 5, 15, 20, 20, 15, 5, -30,
+             -30, 0, 15, 20, 20, 15, 0, -30,
+             -30, 5, 10, 15, 15, 10, 5, -30,
+             -40, -20, 0, 5, 5, 0, -20, -40,
+             -50, -40, -30, -30, -30, -30, -40, -50],
+    BISHOP: [-20, -10, -10, -10, -10, -10, -10, -20,
+             -10, 0, 0, 0, 0, 0, 0, -10,
+             -10, 0, 5, 10, 10, 5, 0, -10,
+             -10, 5, 5, 10, 10, 5, 5, -10,
+             -10, 0, 10, 10, 10, 10, 0, -10,
+             -10, 10, 10, 10, 10, 10, 10, -10,
+             -10, 5, 0, 0, 0, 0, 5, -10,
+             -20, -10, -10, -10, -10, -10, -10, -20],
+    ROOK: [0, 0, 0, 0, 0, 0, 0, 0,
+           5, 10, 10, 10, 10, 10, 10, 5,
+           -5, 0, 0, 0, 0, 0, 0, -5,
+           -5, 0, 0, 0, 0, 0, 0, -5,
+           -5, 0, 0, 0, 0, 0, 0, -5,
+           -5, 0, 0, 0, 0, 0, 0, -5,
+           -5, 0, 0, 0, 0, 0, 0, -5,
+           0, 0, 0, 5, 5, 0, 0, 0],
+    QUEEN: [-20, -10, -10, -5, -5, -10, -10, -20,
+            -10, 0, 0, 0, 0, 0, 0, -10,
+            -10, 0, 5, 5, 5, 5, 0, -10,
+            -5, 0, 5, 5, 5, 5, 0, -5,
+            0, 0, 5, 5, 5, 5, 0, -5,
+            -10, 5, 5, 5, 5, 5, 0, -10,
+            -10, 0, 5, 0, 0, 0, 0, -10,
+            -20, -10, -10, -5, -5, -10, -10, -20],
+    KING: [-30, -40, -40, -50, -50, -40, -40, -30,
+           -30, -40, -40, -50, -50, -40, -40, -30,
+           -30, -40, -40, -50, -50, -40, -40, -30,
+           -30, -40, -40, -50, -50, -40, -40, -30,
+           -20, -30, -30, -40, -40, -30, -30, -20,
+           -10, -20, -20, -20, -20, -20, -20, -10,
+           20, 20, 0, 0, 0, 0, 20, 20,
+           20, 30, 10, 0, 0, 10, 30, 20]}
+_KING_ENDGAME_RANK8_FIRST = [-50, -40, -30, -20, -20, -30, -40, -50,
+                             -30, -20, -10, 0, 0, -10, -20, -30,
+                             -30, -10, 20, 30, 30, 20, -10, -30,
+                             -30, -10, 30, 40, 40, 30, -10, -30,
+                             -30, -10, 30, 40, 40, 30, -10, -30,
+                             -30, -10, 20, 30, 30, 20, -10, -30,
+                             -30, -30, 0, 0, 0, 0, -30, -30,
+                             -50, -30, -30, -30, -30, -30, -30, -50]
+
+
+def _white_table(rank8_first):  # reorders a table written rank 8 first to square indexes (a1=0)
+    return [rank8_first[(7 - sq // 8) * 8 + sq % 8] for sq in range(64)]
+
+
+# material plus square bonus by piece code and square, positive for white pieces and negative for black ones
+PST = [[0] * 64 for _ in range(16)]
+KING_ENDGAME = [[0] * 64, [0] * 64]
+for _kind, _table in _PST_RANK8_FIRST.items():
+    _white = _white_table(_table)
+    for _sq in range(64):
+        PST[make_piece(WHITE, _kind)][_sq] = PIECE_VALUES[_kind] + _white[_sq]
+        PST[make_piece(BLACK, _kind)][_sq] = -PIECE_VALUES[_kind] - _white[_sq ^ 56]
+_white = _white_table(_KING_ENDGAME_RANK8_FIRST)
+for _sq in range(64):
+    KING_ENDGAME[WHITE][_sq] = _white[_sq]
+    KING_ENDGAME[BLACK][_sq] = -_white[_sq ^ 56]
+
+SearchResult = namedtuple('SearchResult', 'move score depth nodes seconds')
+
+
+def score_to_tt(score, ply):  # mate and table win scores are stored as distance from the stored position
+    if score >= WIN_SCORE:
+        return score + ply
+    if score <= -WIN_SCORE:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= WIN_SCORE:
+        return score - ply
+    if score <= -WIN_SCORE:
+        return score + ply
+    return score
+
+
+def bitbase_score(result, plies):
+    return result * (BITBASE_WIN - plies)
+
+
+def evaluate(position, attack_terms=False):
+    """Static score in centipawns from the point of view of the side to move.
+
+    attack_terms adds mobility and pieces in danger, read from the attack maps of a position that tracks them.
+    """
+    bitboards = position.bitboards
+    score = 0
+    phase = 0
+    for piece in (1, 2, 3, 4, 5, 9, 10, 11, 12, 13):
+        table = PST[piece]
+        for sq in squares(bitboards[piece]):
+            score += table[sq]
+            phase += PHASE_WEIGHTS[piece & 7]
+    phase = min(phase, 24)
+    for color in (WHITE, BLACK):
+        king = position.king_square(color)
+        if king >= 0:  # king safety counts in the middlegame, king activity in the endgame
+            score += (PST[color << 3 | KING][king] * phase + KING_ENDGAME[color][king] * (24 - phase)) // 24
+    attacks = position.attacks if attack_terms else None
+    if attacks is not None:  # attack maps kept by make_move, see Position.track_attacks
+        score += MOBILITY_WEIGHT * (sum(attacks[WHITE]) - sum(attacks[BLACK]))
+    score = -score if position.side else score
+    if attacks is not None:  # pieces left in danger: the side to move takes one of them, or saves one of its own
+        side = position.side
+        score += (position.danger_value(side ^ 1, PIECE_VALUES) - position.danger_value(side, PIECE_VALUES)) // 8
+    return score
+
+
+class Engine:
+    def __init__(self, time_limit=1.0, max_depth=MAX_DEPTH, node_limit=0, hash_mb=16, tt=None, abort=None,
+                 attack_maps=False, bitbases=True):
+        self.time_limit = time_limit  # seconds per move
+        self.max_depth = max_depth
+        self.node_limit = node_limit  # 0 for no limit
+        self.tt = tt if tt is not None else TranspositionTable(hash_mb)
+        self.abort = abort  # event set by another process to stop the search, see chess_parallel
+        # evaluate mobility and pieces in danger with attack maps, costs about half of the speed of the search
+        self.attack_maps = attack_maps
+        self.bitbases = bitbases  # endgame tables of chess_bitbase, used when they have been generated
+        self.position = None
+        self.nodes = 0
+        self.deadline = 0
+        self.stopped = False
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history = [[0] * 64 for _ in range(16)]
+
+    def stop(self):
+        self.stopped = True
+
+    def search(self, position, time_limit=None, on_iteration=None, first_depth=1):
+        """Best move for the side to move of position, searched until the time or node budget runs out.
+
+        The position is used in place and is unchanged when the search returns. on_iteration, if given, is
+        called with a SearchResult after each completed depth.
+        """
+        start = time.perf_counter()
+        if self.attack_maps and position.attacks is None:
+            position.track_attacks()
+        self.position = position
+        self.nodes = 0
+        self.stopped = False
+        self.deadline = start + (self.time_limit if time_limit is None else time_limit)
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history = [[0] * 64 for _ in range(16)]
+        self.tt.new_search()
+        root_moves = list(MOVE_CACHE.moves(position))  # usually known already, the gui asked for them
+        if not root_moves:
+            return SearchResult(0, -MATE if position.in_check(position.side) else 0, 0, 0, 0.0)
+        result = SearchResult(root_moves[0], 0, 0, 0, 0.0)
+        if len(root_moves) == 1:
+            return result
+        if self.bitbases:
+            move, probed = bitbase_move(position)
+            if move:  # the table knows the best move, no search needed
+                return SearchResult(move, bitbase_score(*probed), 0, 0, time.perf_counter() - start)
+        for depth in range(first_depth, self.max_depth + 1):
+            best_move, score = self.search_root(root_moves, depth)
+            if self.stopped and best_move is None:
+                break
+            result = SearchResult(best_move, score, depth, self.nodes, time.perf_counter() - start)
+            if self.stopped:
+                break
+            if on_iteration:
+                on_iteration(result)
+            root_moves.remove(best_move)  # the best move is searched first in the next iteration
+            root_moves.insert(0, best_move)
+            if abs(score) >= MATE - MAX_DEPTH:  # mate found, deeper search will not change it
+                break
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - start)
+
+    def search_root(self, root_moves, depth):
+        position = self.position
+        alpha, beta = -MATE - 1, MATE + 1
+        best_move = None
+        for move in root_moves:
+            position.make_move(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, 1)
+            position.unmake_move(move)
+            if self.stopped:
+                break
+            if score > alpha or best_move is None:
+                alpha = score
+                best_move = move
+        return best_move, alpha
+
+    def check_budget(self):
+        if (self.nodes & 1023) == 0 and (time.perf_counter() > self.deadline or
+                                         (self.node_limit and self.nodes >= self.node_limit) or
+                                         (self.abort is not None and self.abort.is_set())):
+            self.stopped = True
+
+    def is_draw(self):
+        position = self.position
+        return position.halfmove >= 100 or (position.halfmove >= 4 and position.repetition_count() >= 2)
+
+    def negamax(self, depth, alpha, beta, ply):
+        self.nodes += 1
+        self.check_budget()
+        if self.stopped:
+            return 0
+        position = self.position
+        if self.is_draw():
+            return 0
+        if self.bitbases:
+            probed = probe(position)
+            if probed is not None:
+                return bitbase_score(probed[0], probed[1] + ply)  # the nearer win is the better one
+        in_check = position.in_check(position.side)
+        if in_check:
+            depth += 1  # check extension
+        if depth <= 0 or ply >= MAX_DEPTH:
+            return self.quiesce(alpha, beta)
+
+        key = position.key
+        tt_move = 0
+        data = self.tt.probe(key)
+        if data:
+            tt_move = entry_move(data)
+            if entry_depth(data) >= depth:
+                score = score_from_tt(entry_score(data), ply)
+                bound = entry_bound(data)
+                if bound == EXACT or (bound == LOWER and score >= beta) or (bound == UPPER and score <= alpha):
+                    return score
+            if tt_move and not is_legal(position, tt_move):
+                tt_move = 0
+
+        board = position.board
+        original_alpha = alpha
+        best_move = 0
+        searched = 0
+        for move in self.ordered_moves(ply, tt_move):
+            position.make_move(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move(move)
+            if self.stopped:
+                return 0
+            searched += 1
+            if score > alpha:
+                alpha = score
+                best_move = move
+                if score >= beta:
+                    to = move >> 6 & 63
+                    if board[to] == EMPTY and not move >> 12:  # quiet move caused the cutoff
+                        killers = self.killers[ply]
+                        if killers[0] != move:
+                            killers[1] = killers[0]
+                            killers[0] = move
+                        self.history[board[move & 63]][to] += depth * depth
+                    self.tt.store(key, move, score_to_tt(beta, ply), depth, LOWER)
+                    return beta
+        if not searched:
+            return -MATE + ply if in_check else 0
+        self.tt.store(key, best_move, score_to_tt(alpha, ply), depth, EXACT if alpha > original_alpha else UPPER)
+        return alpha
+
+    def ordered_moves(self, ply, tt_move=0):
+        """Hash table move first, captures by most valuable victim, then killers, then quiet moves by history.
+
+        The staged generator is read lazily, quiet moves are only generated if no capture caused a cutoff.
+        """
+        position = self.position
+        board = position.board
+        if tt_move:
+            yield tt_move
+        generator = legal_moves(position)
+        captures = []
+        first_quiet = 0
+        for move in generator:
+            if move == tt_move:
+                continue
+            to = move >> 6 & 63
+            if board[to] != EMPTY or move >> 12 or (to == position.ep and board[move & 63] & 7 == PAWN):
+                captures.append(move)
+            else:
+                first_quiet = move
+                break
+        captures.sort(key=lambda m: PIECE_VALUES[board[m & 63] & 7] - 10 * PIECE_VALUES[board[m >> 6 & 63] & 7] -
+                      10 * PIECE_VALUES[m >> 12])
+        yield from captures
+        if not first_quiet:
+            return
+        quiets = [first_quiet]
+        quiets.extend(move for move in generator if move != tt_move)
+        killers = self.killers[ply]
+        for killer in killers:
+            if killer != tt_move and killer in quiets:
+                quiets.remove(killer)
+                yield killer
+        history = self.history
+        quiets.sort(key=lambda m: -history[board[m & 63]][m >> 6 & 63])
+        yield from quiets
+
+    def quiesce(self, alpha, beta):
+        self.nodes += 1
+        self.check_budget()
+        if self.stopped:
+            return 0
+        position = self.position
+        stand_pat = evaluate(position, self.attack_maps)
+        if stand_pat >= beta:
+            return beta
+        if stand_pat > alpha:
+            alpha = stand_pat
+        board = position.board
+        captures = list(legal_moves(position, captures_only=True))
+        captures.sort(key=lambda m: PIECE_VALUES[board[m & 63] & 7] - 10 * PIECE_VALUES[board[m >> 6 & 63] & 7] -
+                      10 * PIECE_VALUES[m >> 12])
+        for move in captures:
+            position.make_move(move)
+            score = -self.quiesce(-beta, -alpha)
+            position.unmake_move(move)
+            if self.stopped:
+                return 0
+            if score > alpha:
+                if score >= beta:
+                    return beta
+                alpha = score
+        return alpha
@@ -0,0 +1,392 @@
+"""Rules side of a game: the board, the captured pieces and the turns, without tkinter.
+
+    python chess_game.py                            the computer plays both sides from the start position
+    python chess_game.py --time 0.2 saved_game.txt  it finishes a saved game
+    python chess_game.py --pgn games.pgn            and appends the game to a PGN file
+    python chess_game.py --book book.bin            it plays the moves of an opening book while it can
+
+GameWindow is built on Game and only adds the canvases, so a game can be played, saved and checked from scripts.
+"""
+import argparse
+import sys
+from collections import namedtuple
+import time
+from chess_position import (Position, START_FEN, EMPTY, KING, LEGACY_CODES, PIECE_LETTERS, SQUARE_INDEX, SQUARE_NAMES,
+                            COLOR_INDEX, COLOR_NAMES, castling_rights)
+from chess_movegen import MOVE_CACHE, encode_move, move_from, move_to, move_promotion, move_name
+from chess_engine import Engine
+from chess_pgn import san, parse_san, pgn_text, read_game
+from chess_archive import GameArchive, ARCHIVE_EXTENSION
+from chess_book import OpeningBook
+
+# what a move changed beside moving the piece from position1 to position2, the window animates these
+MoveEffects = namedtuple('MoveEffects', 'position1 position2 captured_at captured captured_slot rook_from rook_to')
+START_MATERIAL = {'*': 1, 'T': 2, 'A': 2, 'f': 2, 'i': 8}  # pieces of a side at the start, by save file letter
+CASTLING_ROOKS = [(1, 'h1'), (2, 'a1'), (4, 'h8'), (8, 'a8')]  # castling flag of the position -> its rook square
+SAVE_LETTERS = {kind: letter for letter, kind in PIECE_LETTERS.items()}  # piece kind -> letter of the save file
+
+
+def captured_pieces_of(position):
+    """The captured piece lists of the game, worked out from the material left on the board."""
+    codes = [LEGACY_CODES[piece] for piece in position.board if piece != EMPTY]
+    captured = {}
+    for color in ['w', 'b']:
+        missing = []
+        promoted = 0  # a promoted piece stands for a pawn
+        for letter in '*TAf':
+            count = codes.count(color + letter)
+            promoted += max(count - START_MATERIAL[letter], 0)
+            missing += [color + letter] * max(START_MATERIAL[letter] - count, 0)
+        missing += [color + 'i'] * max(START_MATERIAL['i'] - codes.count(color + 'i') - promoted, 0)
+        captured[color] = (missing + ['  '] * 16)[:16]
+    return captured
+
+
+def moved_squares_of(castling):
+    """A these_rook_king_moved list giving the castling rights of a position, see castling_rights."""
+    return [rook for flag, rook in CASTLING_ROOKS if not castling & flag]
+
+
+def char_range(c1, c2):  # stackoverflow.com/questions/7001144/range-over-character-in-python
+    """Generates the characters from `c1` to `c2`, inclusive."""
+    for c in range(ord(c1), ord(c2) + 1):
+        yield chr(c)
+
+
+class Game:
+    def __init__(self):
+        self.chess_board = {}  # game save values start
+        self.captured_pieces = {}
+        self.current_player = None
+        self.current_player2 = None
+        self.other_player = None
+        self.these_rook_king_moved = []
+        self.en_pass_pos = None
+        self.number_of_player = None  # game save values end
+        self.start_fen = None  # position the game was loaded from, and the moves played since, for the PGN
+        self.moves = []
+        self.chess_board_keys = None
+        self.game_still_going = True
+        self.winner = None
+
+    def read_board_setup(self, path, menu_values=None, game=1, ply=None):
+        """Loads a save file, FEN or legacy. Raises OSError, or ValueError, IndexError or KeyError if it is corrupted.
+
+        A FEN save file is an optional header line like 'number_of_player=1 current_player2=man' and the FEN of the
+        position, so a bare FEN line pasted into a file is a save file too. A .pgn file or a game archive gives the
+        position after ply moves (all of them if None) of its game with the given number; only that game is read.
+        """
+        sans = moves = []
+        if path.lower().endswith('.pgn'):
+            headers, sans = read_game(path, game)
+            self.read_fen_setup([headers.get('FEN', START_FEN)])
+        elif path.lower().endswith(ARCHIVE_EXTENSION):
+            with GameArchive(path) as archive:
+                start_fen, _, moves = archive.game(game, ply)
+            self.read_fen_setup([start_fen])
+        else:
+            with open(path, 'r') as file:
+                data = file.read().splitlines()
+            if data and data[0].startswith('a8='):
+                self.read_legacy_setup(data)
+            else:
+                self.read_fen_setup(data)
+        if menu_values:  # the choices of the new game dialog, the side to move is part of the start position
+            self.current_player = menu_values['current_player']
+            self.current_player2 = menu_values['current_player2']
+            self.other_player = menu_values['other_player']
+            self.number_of_player = menu_values['number_of_player']
+        self.chess_board_keys = list(self.chess_board.keys())
+        self.sync_position_state()
+        self.start_fen = self.chess_board.fen()
+        self.moves = []
+        for text in sans[:ply]:
+            self.replay_move(parse_san(self.chess_board, text))
+        for move in moves:
+            self.replay_move(move)
+        self.game_still_going = True
+        self.winner = None
+
+    def read_fen_setup(self, data):
+        lines = [line.strip() for line in data if line.strip()]
+        if not lines:
+            raise ValueError('empty save file')
+        header = dict(field.split('=', 1) for field in lines[0].split()) if len(lines) > 1 else {}
+        chess_board = Position.from_fen(lines[-1])
+        number_of_player = int(header.get('number_of_player', 1))
+        self.chess_board = chess_board
+        self.captured_pieces = captured_pieces_of(chess_board)
+        self.current_player = COLOR_NAMES[chess_board.side]
+        self.other_player = COLOR_NAMES[1 - chess_board.side]
+        self.current_player2 = header.get('current_player2', 'computer' if number_of_player == 0 else 'man')
+        self.these_rook_king_moved = moved_squares_of(chess_board.castling)
+        if chess_board.ep >= 0:  # the square passed over, and the pawn that can be taken
+            ep = SQUARE_NAMES[chess_board.ep]
+            self.en_pass_pos = [ep, ep[0] + ('4' if ep[1] == '3' else '5')]
+        else:
+            self.en_pass_pos = ['  ', '  ']
+        self.number_of_player = number_of_player
+
+    def read_legacy_setup(self, data):  # the 103 line 'a8=bT' save files of the earlier versions
+        chess_board = Position.from_setup(data[0:64])
+        captured_pieces = {'w': [line.split('=')[1] for line in data[65:81]],
+                           'b': [line.split('=')[1] for line in data[81:97]]}
+        values = [line.split('=')[1] for line in data[97:103]]
+        number_of_player = int(values[5])
+        self.chess_board = chess_board
+        self.captured_pieces = captured_pieces
+        self.current_player, self.current_player2, self.other_player = values[0:3]
+        self.these_rook_king_moved = values[3].split(',')
+        self.en_pass_pos = values[4].split(',')
+        self.number_of_player = number_of_player
+
+    def write_board_setup(self, path):
+        with open(path, 'w') as file:
+            file.write(f'number_of_player={self.number_of_player} current_player2={self.current_player2}\n')
+            file.write(self.chess_board.fen() + '\n')
+
+    def result_text(self):
+        if self.game_still_going:
+            return '*'
+        return {'w': '1-0', 'b': '0-1'}.get(self.winner, '1/2-1/2')
+
+    def pgn_text(self, headers=None):
+        """PGN of the moves played since the game was loaded, the headers come before the seven tag roster ones."""
+        position = Position.from_fen(self.start_fen)
+        sans = []
+        for move in self.moves:
+            sans.append(san(position, move))
+            position.make_move(move)
+        tags = {'Event': '?', 'Site': '?', 'Date': time.strftime('%Y.%m.%d'), 'Round': '?', 'White': '?',
+                'Black': '?', 'Result': self.result_text()}
+        tags.update(headers or {})
+        if self.start_fen != START_FEN:
+            tags.update({'SetUp': '1', 'FEN': self.start_fen})
+        fields = self.start_fen.split()
+        return pgn_text(tags, sans, tags['Result'], int(fields[5]) if len(fields) > 5 else 1, fields[1] == 'b')
+
+    def sync_position_state(self):  # copies side to move, castling and en passant info to the rules board
+        castling = castling_rights(self.these_rook_king_moved)
+        for flag, rook in CASTLING_ROOKS:  # the legacy list misses a king or rook away from home, or a taken rook
+            color = 'w' if rook[1] == '1' else 'b'
+            if self.chess_board['e' + rook[1]] != color + '+' or self.chess_board[rook] != color + 'T':
+                castling &= ~flag
+        self.chess_board.set_state(COLOR_INDEX[self.current_player], castling,
+                                   SQUARE_INDEX.get(self.en_pass_pos[0], -1))
+
+    def display_board(self):
+        print('-----------------------------------------------')
+        print('Captured black pieces: ')
+        for i in range(16):
+            if i != 15:
+                print(self.captured_pieces['b'][i], end=' ')
+            else:
+                print(self.captured_pieces['b'][i])
+        print('-----------------------------------------------')
+        print('--|----|----|----|----|----|----|----|----|')
+        for i in self.chess_board_keys:
+            if i not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'h7', 'h8']:
+                if i in ['a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7', 'a8']:
+                    print(str(i)[1] + ' | ' + self.chess_board[i] + ' | ', end='')
+                else:
+                    print(self.chess_board[i] + ' | ', end='')
+            else:
+                print(self.chess_board[i] + ' | ')
+                print('--|----|----|----|----|----|----|----|----|')
+        for i in char_range('a', 'h'):
+            if i != 'h':
+                if i == 'a':
+                    print('X' + ' | ' + i + '  | ', end='')
+                else:
+                    print(i + '  | ', end='')
+            else:
+                print(str(i) + '  | ')
+        print('-----------------------------------------------')
+        print('Captured white pieces: ')
+        for i in range(16):
+            if i != 15:
+                print(self.captured_pieces['w'][i], end=' ')
+            else:
+                print(self.captured_pieces['w'][i])
+        print('-----------------------------------------------')
+
+    def turn_targets(self):
+        """Square name -> legal destinations of the pieces of the side to move, castling rooks get an empty list."""
+        targets = {}
+        for move in MOVE_CACHE.moves(self.chess_board):
+            frm, to = move_from(move), move_to(move)
+            if self.chess_board.board[frm] & 7 == KING and abs(to - frm) == 2:  # castling is started from the rook
+                targets.setdefault(SQUARE_NAMES[(frm & ~7) + (7 if to > frm else 0)], [])
+            elif SQUARE_NAMES[to] not in targets.setdefault(SQUARE_NAMES[frm], []):
+                targets[SQUARE_NAMES[frm]].append(SQUARE_NAMES[to])
+        return targets
+
+    def castling_king(self, rook):
+        """Square of the king if it can castle with the rook on the given square, else None."""
+        for move in MOVE_CACHE.moves(self.chess_board):
+            frm, to = move_from(move), move_to(move)
+            if self.chess_board.board[frm] & 7 == KING and abs(to - frm) == 2 and \
+                    SQUARE_NAMES[(frm & ~7) + (7 if to > frm else 0)] == rook:
+                return SQUARE_NAMES[frm]
+        return None
+
+    def valid_position2s(self, position1):
+        frm = SQUARE_INDEX[position1]
+        king = self.chess_board.board[frm] & 7 == KING
+        targets = [SQUARE_NAMES[move_to(move)] for move in MOVE_CACHE.moves(self.chess_board)  # castling has a menu
+                   if move_from(move) == frm and not (king and abs(move_to(move) - frm) == 2)]
+        return list(dict.fromkeys(targets))  # a promotion is four moves to one square
+
+    def play_move(self, position1, position2):
+        """Plays a legal move of the current player and keeps the save values up to date, returns its MoveEffects.
+
+        Castling is the king's move, the rook goes with it. A pawn reaching the last rank stays a pawn until promote.
+        """
+        piece = self.chess_board[position1]
+        captured_at = captured = captured_slot = rook_from = rook_to = None
+        if piece[1] == 'i' and position2 == self.en_pass_pos[0]:
+            captured_at = self.en_pass_pos[1]
+            print('En passant!')
+        elif self.chess_board[position2] != '  ':
+            captured_at = position2
+        if captured_at:  # copying the piece to the other player's captured list
+            captured = self.chess_board[captured_at]
+            captured_slot = self.captured_pieces[self.other_player].index('  ')
+            self.captured_pieces[self.other_player][captured_slot] = captured
+        # register first move of rook and king for castling
+        if piece[1] == '+' or piece[1] == 'T':
+            self.these_rook_king_moved.append(position2)
+            if position1 in self.these_rook_king_moved:
+                self.these_rook_king_moved.remove(position1)
+        if piece[1] == '+' and abs(ord(position2[0]) - ord(position1[0])) == 2:
+            if position2[0] == 'g':
+                rook_from, rook_to = 'h' + position1[1], 'f' + position1[1]
+            else:
+                rook_from, rook_to = 'a' + position1[1], 'd' + position1[1]
+            print('Castling with rook_' + rook_from)
+            self.these_rook_king_moved.append(rook_to)
+        if piece[1] == 'i' and abs(int(position2[1]) - int(position1[1])) == 2:
+            self.en_pass_pos = [position2[0] + str((int(position1[1]) + int(position2[1])) // 2), position2]
+            print(f'En passant possible for {self.en_pass_pos[1]}, capture at {self.en_pass_pos[0]}')
+        else:
+            self.en_pass_pos = ['  ', '  ']
+        move = encode_move(SQUARE_INDEX[position1], SQUARE_INDEX[position2])
+        self.chess_board.make_move(move)
+        self.moves.append(move)
+        return MoveEffects(position1, position2, captured_at, captured, captured_slot, rook_from, rook_to)
+
+    def replay_move(self, move):  # a whole turn of a loaded game, the move comes from a file
+        if move not in MOVE_CACHE.moves(self.chess_board):
+            raise ValueError('illegal move in game file: ' + move_name(move))
+        self.play_move(SQUARE_NAMES[move_from(move)], SQUARE_NAMES[move_to(move)])
+        if move_promotion(move):
+            self.promote(self.current_player, SAVE_LETTERS[move_promotion(move)])
+        self.flip_player()
+
+    def promotion_coordinate(self, x):
+        if x == 'w':
+            for i in self.chess_board_keys[0: 8]:  # a8-h8
+                if self.chess_board[i] == 'wi':
+                    return i
+        elif x == 'b':
+            for i in self.chess_board_keys[56: 65]:  # a1-h1
+                if self.chess_board[i] == 'bi':
+                    return i
+
+    def promote(self, x, piece):  # piece is the letter of the save file, returns the square of the promotion
+        coordinate = self.promotion_coordinate(x)
+        self.chess_board[coordinate] = x + piece
+        self.moves[-1] |= PIECE_LETTERS[piece] << 12  # the promotion is part of the pawn's move
+        print('Promotion occurred. ' + x + 'i became ' + x + piece + '.')
+        return coordinate
+
+    def flip_player(self):
+        if self.current_player == 'w':
+            self.current_player = 'b'
+            self.other_player = 'w'
+        elif self.current_player == 'b':
+            self.current_player = 'w'
+            self.other_player = 'b'
+        if (self.number_of_player == 1 and self.current_player2 == 'man') or \
+                self.number_of_player == 0:
+            self.current_player2 = 'computer'
+        elif (self.number_of_player == 1 and self.current_player2 == 'computer') or \
+                self.number_of_player == 2:
+            self.current_player2 = 'man'
+        self.chess_board.commit_moves()  # real moves are never taken back
+        self.sync_position_state()
+
+    def check_if_game_still_going(self, x):
+        legal_move = self.legal_move_possible(x)  # to prevent running the method twice
+        all_player_pos = {self.chess_board[i]: i for i in self.chess_board_keys if self.chess_board[i] != '  '}
+        if not legal_move and self.king_in_check(x, self.chess_board):  # checkmate
+            self.game_still_going = False
+            self.winner = self.other_player
+        elif not legal_move:  # stalemate
+            self.game_still_going = False
+        # other stalemates:
+        elif {'w+', 'b+'} == set(all_player_pos):
+            self.game_still_going = False  # only king - king left
+        elif {'w+', 'b+', 'wA'} == set(all_player_pos) or {'w+', 'b+', 'bA'} == set(all_player_pos):
+            self.game_still_going = False  # only king - king+bishop left
+        elif {'w+', 'b+', 'wf'} == set(all_player_pos) or {'w+', 'b+', 'bf'} == set(all_player_pos):
+            self.game_still_going = False  # only king - king+knight left
+        elif {'w+', 'b+', 'wA', 'bA'} == set(all_player_pos) and \
+                self.square_parity(all_player_pos['wA']) == self.square_parity(all_player_pos['bA']):
+            self.game_still_going = False  # only king+bishop - king+bishop left, with bishops on same color
+        if self.chess_board.repetition_count() >= 3:
+            self.game_still_going = False   # the same position repeated for 3x times
+
+    @staticmethod
+    def square_parity(pos):  # 0 for dark squares, 1 for light squares
+        return (ord(pos[0]) + int(pos[1])) % 2
+
+    def legal_move_possible(self, x):  # the rules board holds x as side to move, see sync_position_state
+        return len(MOVE_CACHE.moves(self.chess_board)) > 0  # the same list serves the highlighting of the turn
+
+    @staticmethod
+    def king_in_check(x, board):
+        return board.in_check(COLOR_INDEX[x])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Let the computer play a game to its end, without a window.')
+    parser.add_argument('file', nargs='?', default='initial_setup.txt', help='save file (default: new game)')
+    parser.add_argument('--time', type=float, default=0.1, help='seconds per move (default 0.1)')
+    parser.add_argument('--max-plies', type=int, default=400, help='stop after this many moves (default 400)')
+    parser.add_argument('--save', help='save the final position to this file')
+    parser.add_argument('--pgn', help='append the game to this PGN file')
+    parser.add_argument('--book', help='Polyglot opening book')
+    args = parser.parse_args(argv)
+
+    game = Game()
+    game.read_board_setup(args.file)
+    game.number_of_player = 0  # computer against computer
+    engine = Engine(time_limit=args.time)
+    book = OpeningBook(args.book) if args.book else None
+    plies = 0
+    game.check_if_game_still_going(game.current_player)
+    while game.game_still_going and plies < args.max_plies:
+        move = book.choose(game.chess_board) if book else 0  # 0 when the game has left the book
+        move = move or engine.search(game.chess_board.copy()).move
+        text = san(game.chess_board, move)
+        game.play_move(SQUARE_NAMES[move_from(move)], SQUARE_NAMES[move_to(move)])
+        if move_promotion(move):
+            game.promote(game.current_player, SAVE_LETTERS[move_promotion(move)])
+        print(f'{plies // 2 + 1}.{"" if game.current_player == "w" else ".."} {text}')
+        game.flip_player()
+        game.check_if_game_still_going(game.current_player)
+        plies += 1
+    game.display_board()
+    print({'w': 'White wins the game.', 'b': 'Black wins the game.'}.get(
+        game.winner, 'The game is a draw.' if not game.game_still_going else 'The game goes on.'))
+    if args.save:
+        game.write_board_setup(args.save)
+    if args.pgn:
+        with open(args.pgn, 'a') as file:
+            file.write(game.pgn_text({'Event': 'chess_game.py', 'White': 'computer', 'Black': 'computer'}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
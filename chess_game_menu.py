@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
-from chess_game_window import GameWindow, instructions_text, center
+from chess_game_window import GameWindow, instructions_text, center, SAVE_FILE_TYPES
 
 
 class GameMenu:
@@ -146,7 +146,7 @@ class GameMenu:
         new_game_window.destroy()
 
     def load_game_dialog(self):
-        path = tk.filedialog.askopenfilename(filetypes=[('Text Documents', '*.txt')])
+        path = tk.filedialog.askopenfilename(filetypes=SAVE_FILE_TYPES)
         if path:
             self.file_to_load = path
             self.start_pressed.set(True)
@@ -155,4 +155,4 @@ class GameMenu:
 if __name__ == '__main__':
     root = tk.Tk()
     GameMenu(root)
-    # root.mainloop()
+    root.mainloop()
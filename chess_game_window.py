@@ -1,13 +1,19 @@
+import queue
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import random
-import operator
+from tkinter import ttk, messagebox, filedialog, simpledialog
+from chess_position import EMPTY, LEGACY_CODES, SQUARE_INDEX, SQUARE_NAMES
+from chess_movegen import move_from, move_to, move_promotion
+from chess_parallel import ParallelEngine, cpu_count
+from chess_animation import Animator
+from chess_game import Game, SAVE_LETTERS, char_range
+from chess_archive import ARCHIVE_EXTENSION
+from chess_book import OpeningBook, BOOK_FILE
+from chess_engine import SearchResult
 
-
-def char_range(c1, c2):  # stackoverflow.com/questions/7001144/range-over-character-in-python
-    """Generates the characters from `c1` to `c2`, inclusive."""
-    for c in range(ord(c1), ord(c2) + 1):
-        yield chr(c)
+SAVE_FILE_TYPES = [('Saved games', '*.fen *.txt'), ('FEN positions', '*.fen'), ('Text Documents', '*.txt')]
+PGN_FILE_TYPES = [('PGN databases', '*.pgn')]
+LOAD_FILE_TYPES = SAVE_FILE_TYPES + [('Game archives', '*' + ARCHIVE_EXTENSION)]
 
 
 def center(win, x_offset, y_offset):
@@ -23,8 +29,11 @@ def center(win, x_offset, y_offset):
                  f'+{win.winfo_screenheight() // 2 - win_height // 2 - y_offset}')
 
 
-class GameWindow:
+class GameWindow(Game):
+    """The game on tkinter canvases. Every step of a turn is a callback of the tk loop, see next_turn."""
+
     def __init__(self, master, screen_size, file_to_load, from_menu):
+        Game.__init__(self)
         self.master = master
         self.master.title('GMF Chess')
         try:
@@ -33,6 +42,7 @@ class GameWindow:
             print('Game icon file not found')
         self.screen_size = screen_size  # (1024, 576)(1366, 768)(1920, 1080)
         self.file_to_load = file_to_load
+        self.pgn_choice = (1, None)  # game number and ply when file_to_load is a PGN file or an archive
         self.menu_initiated_values = from_menu
         # 2 blue edge, 50 bar and menu, 40 tray = 92
         self.master.minsize(self.screen_size[0] - 2, self.screen_size[1] - 92)
@@ -50,77 +60,89 @@ class GameWindow:
         # font parameters (size 20 for 1366x768)
         self.font = {'size': int(self.square_size / 3.5), 'color': 'black', 'type': 'TKDefaultFont'}
 
-        self.chess_board = {}  # game save values start
-        self.captured_pieces = {}
-        self.current_player = None
-        self.current_player2 = None
-        self.other_player = None
-        self.these_rook_king_moved = []
-        self.en_pass_pos = None
-        self.number_of_player = None  # game save values end
-        self.chess_board_keys = None
-        self.chess_board_virtual = None
         self.c_chess = None
-        self.currently_selected = tk.StringVar()
+        # what the window waits for: 'idle', 'position1' and 'position2' of the man, 'computer', 'promotion' or
+        # 'over' when the game has ended and the result is about to be told
+        self.state = 'idle'
         self.show_legal_moves_man = tk.BooleanVar(value=True)
         self.show_legal_moves_computer = tk.BooleanVar(value=False)
+        self.use_book = tk.BooleanVar(value=True)
         self.c = {}  # dictionary for gui elements created later and used for multiple methods
+        self.square_centers = {}  # square name -> canvas coordinates of its center, see draw_squares
+        self.square_items = {}  # square name -> canvas item of the square
+        self.piece_items = {}  # square name -> canvas item of the piece standing there, see draw_pieces
+        self.piece_squares = {}  # canvas item of a piece -> square name
+        self.shown_board = [EMPTY] * 64  # pieces on the canvas when the animations are done, see render_position
+        self.captured_items = {}  # color -> canvas items of the 16 captured piece slots
+        self.captured_codes = {}  # color -> pieces shown in the captured slots
         self.bak = {}  # dictionary for backups
         self.position1 = None
         self.position2 = None
         self.selected_piece = None
-        self.game_still_going = True
-        self.winner = None
+        self.legal_targets = {}  # legal moves of the man's turn, see handle_turn
         self.castling_rook = None  # tempo info holder for castling
         self.king_position = None  # tempo info holder for castling
-        self.piece_dgr = {}
-        self.previous_12_board = {}
         self.game_is_saved = False
         self.game_speed = 1000
+        self.animator = Animator(self.master)  # every delayed canvas update goes through its frame timer
+        self.engine = ParallelEngine(workers=1, time_limit=1.0)  # computer player, searches one second per move
+        try:
+            self.book = OpeningBook(BOOK_FILE)  # the computer plays its moves while the game is in the book
+        except (OSError, ValueError):
+            self.book = None
+        self.search_thread = None  # the engine runs beside the tk loop, see start_search
+        self.search_results = None
 
-        self.start_new_game = True
-        while self.start_new_game:
-            self.play_game()
+        self.start_game()  # the game goes on in the tk loop
 
-    def play_game(self):
+    def start_game(self):
         self.clear_previous_session()
-        self.draw_menu()
-        self.load_board_setup()
+        if not self.load_board_setup():
+            return
         self.display_board()  # legacy display in terminal
-        self.draw_4_main_canvas()
-        self.draw_chess_board()
-        self.draw_captured_areas()
+        if self.c_chess is None:  # the widgets are built once, later games only refill them
+            self.draw_menu()
+            self.draw_4_main_canvas()
+            self.draw_chess_board()
+            self.draw_captured_areas()
+            self.draw_squares()
         self.draw_captured_pieces()
-        self.draw_squares()
         self.draw_pieces()
         # center(self.master, 0, 18)
         self.master.focus_set()
-        while self.game_still_going:
-            if (self.number_of_player == 1 and self.current_player2 == 'man') or self.number_of_player == 2:
-                self.handle_turn(self.current_player)
-                if self.promotion_coordinate(self.current_player):
-                    self.promotion_dialog(self.current_player)
-            else:
-                if self.number_of_player == 0:   # to leave time to finish rendering
-                    self.master.after(self.game_speed * 3, lambda: self.currently_selected.set('demo'))
-                    self.c_chess.wait_variable(self.currently_selected)
-                if self.currently_selected.get() != 'exit':
-                    self.computer_turn(self.current_player)
-                    if self.promotion_coordinate(self.current_player):
-                        self.computer_promotion(self.current_player)
-            self.game_is_saved = False
-            self.flip_player()
-            self.check_if_game_still_going(self.current_player)
-        self.ask_for_new_game()
-
-    def clear_previous_session(self):
+        self.check_if_game_still_going(self.current_player)
+        if self.promotion_coordinate(self.current_player):  # the backup of a game left in the promotion dialog
+            self.promotion_dialog(self.current_player)
+        else:
+            self.next_turn()
+
+    def next_turn(self):
+        """Starts the turn of the current player and returns to the tk loop, the turn ends in end_turn."""
+        if not self.game_still_going:
+            self.state = 'over'
+            self.animator.begin()  # the result is told when the last move has been shown
+            self.animator.schedule(0, lambda: self.master.after_idle(self.ask_for_new_game))
+        elif (self.number_of_player == 1 and self.current_player2 == 'man') or self.number_of_player == 2:
+            self.handle_turn(self.current_player)
+        else:
+            self.computer_turn(self.current_player)
+
+    def end_turn(self):
+        self.game_is_saved = False
+        self.flip_player()
+        self.check_if_game_still_going(self.current_player)
+        self.next_turn()
+
+    def clear_previous_session(self):  # ends the turn the window waits for, whatever it is
+        if self.state == 'position2':  # the man's selection is taken back
+            self.unselect_piece()
+        elif self.state == 'promotion':
+            self.c['promotion_window'].destroy()
+        self.state = 'idle'
         self.game_still_going = True
         self.winner = None
-        self.position1 = None   # this indicates first turn, see handle turn initialize select piece
-        self.previous_12_board = {str(i) + 'ago': {} for i in range(1, 13)}
-        for widget in self.master.winfo_children():
-            print('destroying' + str(widget))
-            widget.destroy()
+        self.position1 = None
+        self.animator.finish()  # the canvases are reused, the pieces must stand where the index says
 
     def draw_menu(self):
         def show_help():
@@ -138,6 +160,9 @@ class GameWindow:
         file_menu.add_command(label='Load Game', command=self.load_game)
         file_menu.add_command(label='Save Game', command=self.save_game)
         file_menu.add_separator()
+        file_menu.add_command(label='Load PGN Game', command=self.load_pgn_game)
+        file_menu.add_command(label='Export PGN', command=self.export_pgn)
+        file_menu.add_separator()
         file_menu.add_command(label='Exit', command=self.exit_game)
         options_menu.add_command(label='Settings', command=self.settings_dialog)
         help_menu.add_command(label='About', command=show_help)
@@ -150,64 +175,105 @@ class GameWindow:
     def new_game(self):
         new_response = tk.messagebox.askyesno(title='New game', message='Do you want to start new game?')
         if new_response:
-            if self.number_of_player != 2:  # to leave time to finish rendering
-                self.master.after(self.game_speed * 2, lambda: self.currently_selected.set('demo'))
-                self.c_chess.wait_variable(self.currently_selected)
-            self.game_still_going = False
+            self.stop_search()
+            self.save_backup()
+            self.clear_previous_session()  # nothing of the old turn may act until the new game starts
             self.file_to_load = 'initial_setup.txt'
             self.menu_initiated_values['current_player'] = 'w'  # too keep these preferences
             self.menu_initiated_values['current_player2'] = 'man'
             self.menu_initiated_values['other_player'] = 'b'
             self.menu_initiated_values['number_of_player'] = self.number_of_player
-            self.currently_selected.set('exit')
             print('Setting up new game')
+            self.master.after_idle(self.start_game)
 
     def load_game(self):
-        path = tk.filedialog.askopenfilename(filetypes=[('Text Documents', '*.txt')])
+        path = tk.filedialog.askopenfilename(filetypes=LOAD_FILE_TYPES)  # the .txt files are the legacy format
+        if not path:
+            return
+        if path.lower().endswith(ARCHIVE_EXTENSION):  # an archive holds many games
+            pgn_choice = self.ask_game_choice('Load Game')
+            if pgn_choice:
+                self.open_file(path, pgn_choice)
+        else:
+            self.open_file(path)
+
+    def load_pgn_game(self):
+        path = tk.filedialog.askopenfilename(filetypes=PGN_FILE_TYPES)
         if path:
-            self.bak['chess_board'] = self.chess_board.copy()  # saving backups
-            self.bak['captured_pieces'] = self.captured_pieces.copy()
-            self.bak['current_player'] = self.current_player
-            self.bak['current_player2'] = self.current_player2
-            self.bak['other_player'] = self.other_player
-            self.bak['these_rook_king_moved'] = self.these_rook_king_moved.copy()
-            self.bak['en_pass_pos'] = self.en_pass_pos.copy()
-            self.bak['number_of_player'] = self.number_of_player
-            self.game_still_going = False
-            self.file_to_load = path
-            self.currently_selected.set('exit')
-            print('Loading game from file')
+            pgn_choice = self.ask_game_choice('Load PGN Game')
+            if pgn_choice:
+                self.open_file(path, pgn_choice)
+
+    def ask_game_choice(self, title):  # game number and ply of a database, None if the man cancelled
+        game = tk.simpledialog.askinteger(title, 'Number of the game in the file:', initialvalue=1, minvalue=1,
+                                          parent=self.master)
+        if game is None:
+            return None
+        ply = tk.simpledialog.askstring(title, 'Number of moves to play from its start (empty for all):',
+                                        parent=self.master)
+        if ply is None:
+            return None
+        return game, int(ply) if ply.strip().isdigit() else None
+
+    def open_file(self, path, pgn_choice=(1, None)):
+        self.stop_search()
+        self.save_backup()
+        self.clear_previous_session()  # nothing of the old turn may act until the new game starts
+        self.file_to_load = path
+        self.pgn_choice = pgn_choice
+        print('Loading game from file')
+        self.master.after_idle(self.start_game)
+
+    def save_backup(self):  # the game goes on from here if the file turns out to be corrupted
+        self.bak['chess_board'] = self.chess_board.copy()
+        self.bak['captured_pieces'] = {color: pieces.copy() for color, pieces in self.captured_pieces.items()}
+        self.bak['current_player'] = self.current_player
+        self.bak['current_player2'] = self.current_player2
+        self.bak['other_player'] = self.other_player
+        self.bak['these_rook_king_moved'] = self.these_rook_king_moved.copy()
+        self.bak['en_pass_pos'] = self.en_pass_pos.copy()
+        self.bak['number_of_player'] = self.number_of_player
+        self.bak['start_fen'] = self.start_fen
+        self.bak['moves'] = self.moves.copy()
+
+    def restore_backup(self):
+        self.chess_board = self.bak['chess_board'].copy()
+        self.captured_pieces = {color: pieces.copy() for color, pieces in self.bak['captured_pieces'].items()}
+        self.current_player = self.bak['current_player']
+        self.current_player2 = self.bak['current_player2']
+        self.other_player = self.bak['other_player']
+        self.these_rook_king_moved = self.bak['these_rook_king_moved'].copy()
+        self.en_pass_pos = self.bak['en_pass_pos'].copy()
+        self.number_of_player = self.bak['number_of_player']
+        self.start_fen = self.bak['start_fen']
+        self.moves = self.bak['moves'].copy()
+        self.sync_position_state()
 
     def save_game(self):
-        path = tk.filedialog.asksaveasfilename(defaultextension='.txt', filetypes=[('Text Documents', '*.txt')])
+        path = tk.filedialog.asksaveasfilename(defaultextension='.fen', filetypes=SAVE_FILE_TYPES[1:])
         if path:
-            file = open(path, 'w')
-            for key in self.chess_board:
-                file.write(key + '=' + self.chess_board[key] + '\n')
-            file.write('captured pieces\n')
-            captured_indexes = {}
-            for color in ['w', 'b']:
-                captured_indexes[color] = [color + str(i) for i in range(16)]
-                for pos, value in list(zip(captured_indexes[color], self.captured_pieces[color])):
-                    file.write(pos + '=' + value + '\n')
-            file.write('current_player=' + self.current_player + '\n')
-            file.write('current_player2=' + self.current_player2 + '\n')
-            file.write('other_player=' + self.other_player + '\n')
-            file.write('these_rook_king_moved=' + ','.join(self.these_rook_king_moved) + '\n')
-            file.write('en_pass_pos=' + ','.join(self.en_pass_pos) + '\n')
-            file.write('number_of_player=' + str(self.number_of_player))
-            file.close()
+            self.write_board_setup(path)
             self.game_is_saved = True
             print('Game is saved')
             return True
 
+    def export_pgn(self):
+        path = tk.filedialog.asksaveasfilename(defaultextension='.pgn', filetypes=PGN_FILE_TYPES,
+                                               confirmoverwrite=False)
+        if path:
+            other = self.current_player2 if self.number_of_player != 1 else \
+                {'man': 'computer', 'computer': 'man'}[self.current_player2]
+            players = {self.current_player: self.current_player2, self.other_player: other}
+            with open(path, 'a') as file:  # a PGN file is a database, the game is added to its end
+                file.write(self.pgn_text({'Event': 'GMF Chess', 'White': players['w'], 'Black': players['b']}))
+            print('Game is exported')
+
     def exit_game(self):
         def exiting():
-            self.start_new_game = False
-            self.game_still_going = False
-            self.currently_selected.set('exit')
+            self.stop_search()
+            self.state = 'idle'
             print('Exiting chess')
-            self.master.destroy()
+            self.close()
 
         if self.game_is_saved:
             exit_response = tk.messagebox.askyesno(title='Quit game', message='Do you want to exit game?')
@@ -222,16 +288,20 @@ class GameWindow:
                 exiting()
 
     def settings_dialog(self):
+        if self.c.get('settings_window') is not None and self.c['settings_window'].winfo_exists():
+            self.c['settings_window'].lift()  # already open, the game goes on meanwhile
+            return
         show_legal_moves_man2 = tk.BooleanVar(value=self.show_legal_moves_man.get())
         show_legal_moves_cmp2 = tk.BooleanVar(value=self.show_legal_moves_computer.get())
+        use_book2 = tk.BooleanVar(value=self.use_book.get())
         number_of_player2 = tk.IntVar(value=self.number_of_player)
-        settings_selected = tk.BooleanVar()
+        search_workers2 = tk.IntVar(value=self.engine.workers)
 
-        settings_window = tk.Toplevel(self.master)
+        settings_window = self.c['settings_window'] = tk.Toplevel(self.master)
         settings_window.focus_set()
         settings_window.title('Settings')
         settings_window.resizable(False, False)
-        settings_window.protocol("WM_DELETE_WINDOW", lambda: settings_selected.set(True))
+        settings_window.protocol("WM_DELETE_WINDOW", settings_window.destroy)
 
         settings_frame = ttk.Frame(settings_window, padding=10)
         settings_frame.grid(column=0, row=0, sticky='n, w, e, s')
@@ -241,6 +311,8 @@ class GameWindow:
         self.c['msg2'] = ttk.Label(settings_frame, text='No player mode (computer-computer) for demo:', padding=5)
         self.c['msg3'] = ttk.Label(settings_frame, text='Highlight legal movement squares for player:', padding=5)
         self.c['msg4'] = ttk.Label(settings_frame, text='Highlight legal movement squares for computer:', padding=5)
+        self.c['msg5'] = ttk.Label(settings_frame, text='Processes used by the computer player:', padding=5)
+        self.c['msg6'] = ttk.Label(settings_frame, text=f'Computer plays opening moves of {BOOK_FILE}:', padding=5)
         self.c['button0'] = ttk.Radiobutton(settings_frame, variable=number_of_player2, value=2, padding=5)
         self.c['button1'] = ttk.Radiobutton(settings_frame, variable=number_of_player2, value=1, padding=5)
         self.c['button2'] = ttk.Radiobutton(settings_frame, variable=number_of_player2, value=0, padding=5)
@@ -248,97 +320,50 @@ class GameWindow:
             ttk.Checkbutton(settings_frame, variable=show_legal_moves_man2, onvalue=True, offvalue=False, padding=5)
         self.c['button4'] = \
             ttk.Checkbutton(settings_frame, variable=show_legal_moves_cmp2, onvalue=True, offvalue=False, padding=5)
-        for i in [0, 1, 2, 3, 4]:
+        self.c['button5'] = ttk.Spinbox(settings_frame, textvariable=search_workers2, from_=1, to=cpu_count(), width=3)
+        self.c['button6'] = ttk.Checkbutton(settings_frame, variable=use_book2, onvalue=True, offvalue=False, padding=5,
+                                            state='normal' if self.book is not None else 'disabled')
+        for i in [0, 1, 2, 3, 4, 5, 6]:
             self.c['msg' + str(i)].grid(column=0, row=i, columnspan=3, sticky='n, w')
             self.c['button' + str(i)].grid(column=3, row=i, sticky='n, e')
 
         def apply_button_logic():
             self.show_legal_moves_man.set(show_legal_moves_man2.get())
             self.show_legal_moves_computer.set(show_legal_moves_cmp2.get())
+            self.use_book.set(use_book2.get())
             self.number_of_player = number_of_player2.get()
-            settings_selected.set(True)
+            try:
+                self.engine.workers = min(max(search_workers2.get(), 1), cpu_count())  # used from the next search
+            except tk.TclError:
+                print('Invalid number of processes, not changed')
+            settings_window.destroy()  # the number of players counts from the next turn, see next_turn
 
         apply_button = ttk.Button(settings_frame, text='Apply', command=apply_button_logic)
-        cancel_button = ttk.Button(settings_frame, text='Cancel', command=lambda: settings_selected.set(True))
-        apply_button.grid(column=2, row=5, sticky='n, e, s')
-        cancel_button.grid(column=3, row=5, sticky='n, s')
+        cancel_button = ttk.Button(settings_frame, text='Cancel', command=settings_window.destroy)
+        apply_button.grid(column=2, row=7, sticky='n, e, s')
+        cancel_button.grid(column=3, row=7, sticky='n, s')
 
-        self.master.wait_variable(settings_selected)
-        settings_window.destroy()
-
-    def load_board_setup(self):
+    def load_board_setup(self):  # returns False if the game can't go on
+        menu_values = self.menu_initiated_values if self.file_to_load == 'initial_setup.txt' else None
         try:
-            file = open(self.file_to_load, 'r')
-            data = file.read().splitlines()
-            self.chess_board = {line.split('=')[0]: line.split('=')[1] for line in data[0:64]}
-            self.captured_pieces['w'] = [line.split('=')[1] for line in data[65:81]]
-            self.captured_pieces['b'] = [line.split('=')[1] for line in data[81:97]]
-            self.current_player = data[97].split('=')[1]
-            self.current_player2 = data[98].split('=')[1]
-            self.other_player = data[99].split('=')[1]
-            rook_king_moved_string = data[100].split('=')[1]
-            self.these_rook_king_moved = rook_king_moved_string.split(',')
-            en_pass_pos_string = data[101].split('=')[1]
-            self.en_pass_pos = en_pass_pos_string.split(',')
-            self.number_of_player = int(data[102].split('=')[1])
-            file.close()
-            self.chess_board_keys = list(self.chess_board.keys())
-            if self.menu_initiated_values and self.file_to_load == 'initial_setup.txt':
-                self.current_player = self.menu_initiated_values['current_player']
-                self.current_player2 = self.menu_initiated_values['current_player2']
-                self.other_player = self.menu_initiated_values['other_player']
-                self.number_of_player = self.menu_initiated_values['number_of_player']
-        except FileNotFoundError as error:
+            self.read_board_setup(self.file_to_load, menu_values, *self.pgn_choice)
+        except OSError as error:  # missing, a directory or not readable
             print(error)
-            tk.messagebox.showerror(title='Error', message='initial_setup.txt is missing from game directory!')
-            self.master.destroy()
-        except IndexError:
+            tk.messagebox.showerror(title='Error', message=f'{self.file_to_load} can not be read!',
+                                    detail=error.strerror)
+            return self.restore_backup_or_close()
+        except (IndexError, KeyError, ValueError):
             print('Game file is corrupted!')
-            tk.messagebox.showerror(title='Error', message='Game file is corrupted!')
-            self.chess_board = self.bak['chess_board'].copy()  # restoring backups
-            self.captured_pieces = self.bak['captured_pieces'].copy()
-            self.current_player = self.bak['current_player']
-            self.current_player2 = self.bak['current_player2']
-            self.other_player = self.bak['other_player']
-            self.these_rook_king_moved = self.bak['these_rook_king_moved'].copy()
-            self.en_pass_pos = self.bak['en_pass_pos'].copy()
-            self.number_of_player = self.bak['number_of_player']
-
-    def display_board(self):
-        print('-----------------------------------------------')
-        print('Captured black pieces: ')
-        for i in range(16):
-            if i != 15:
-                print(self.captured_pieces['b'][i], end=' ')
-            else:
-                print(self.captured_pieces['b'][i])
-        print('-----------------------------------------------')
-        print('--|----|----|----|----|----|----|----|----|')
-        for i in self.chess_board_keys:
-            if i not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'h7', 'h8']:
-                if i in ['a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7', 'a8']:
-                    print(str(i)[1] + ' | ' + self.chess_board[i] + ' | ', end='')
-                else:
-                    print(self.chess_board[i] + ' | ', end='')
-            else:
-                print(self.chess_board[i] + ' | ')
-                print('--|----|----|----|----|----|----|----|----|')
-        for i in char_range('a', 'h'):
-            if i != 'h':
-                if i == 'a':
-                    print('X' + ' | ' + i + '  | ', end='')
-                else:
-                    print(i + '  | ', end='')
-            else:
-                print(str(i) + '  | ')
-        print('-----------------------------------------------')
-        print('Captured white pieces: ')
-        for i in range(16):
-            if i != 15:
-                print(self.captured_pieces['w'][i], end=' ')
-            else:
-                print(self.captured_pieces['w'][i])
-        print('-----------------------------------------------')
+            tk.messagebox.showerror(title='Error', message=f'{self.file_to_load} is corrupted!')
+            return self.restore_backup_or_close()
+        return True
+
+    def restore_backup_or_close(self):  # the first game has no backup to go on with
+        if not self.bak:
+            self.close()
+            return False
+        self.restore_backup()
+        return True
 
     def draw_4_main_canvas(self):
         self.c['left_side'] = self.screen_size[1] - 100  # 92 plus 3 + 5
@@ -432,15 +457,24 @@ class GameWindow:
             return x, y
 
         for color in ['b', 'w']:
+            if color in self.captured_items:  # only the slots that differ from the shown game are rewritten
+                for i, code in enumerate(self.captured_pieces[color]):
+                    if self.captured_codes[color][i] != code:
+                        self.animator.configure(self.c['captured'][color], self.captured_items[color][i], 0,
+                                                text=self.txt_map_piece(code[1]))
+                self.captured_codes[color] = self.captured_pieces[color].copy()
+                continue
+            self.captured_items[color] = []
             for i in range(0, 16):
-                self.c['captured'][color].create_text(
+                self.captured_items[color].append(self.c['captured'][color].create_text(
                     get_captured_center(i),
                     text=self.txt_map_piece(self.captured_pieces[color][i][1]),
                     tag=f'captured_{str(i)}',
                     fill=self.txt_map_color(color)[0],
                     activefill=self.txt_map_color(color)[1],  # not used yet
                     font=(self.font['type'], self.piece_size),
-                    state=tk.DISABLED)
+                    state=tk.DISABLED))
+            self.captured_codes[color] = self.captured_pieces[color].copy()
         # for i in range(1, 17):
         #     print(self.c['captured']['w'].gettags(i))
 
@@ -461,19 +495,34 @@ class GameWindow:
             y0 = abs(int(i[1]) - 8) * self.square_size
             x1 = (ord(i[0]) - 96) * self.square_size
             y1 = abs(int(i[1]) - 9) * self.square_size
-            self.c_chess.create_rectangle(x0, y0, x1, y1, fill=self.pos_map_color(i)[0], width=0,
-                                          activefill=self.pos_map_color(i)[1], tag=('square', 'square_' + i))
+            self.square_centers[i] = ((x0 + x1) / 2, (y0 + y1) / 2)  # geometry is kept on the python side
+            self.square_items[i] = self.c_chess.create_rectangle(
+                x0, y0, x1, y1, fill=self.pos_map_color(i)[0], width=0, activefill=self.pos_map_color(i)[1],
+                tag='square')
             # e not used but always created as event, so a new kw parameter n is created which is local to lambda
-            self.c_chess.tag_bind('square_' + i, '<Button-1>', lambda e, n=i: self.currently_selected.set(n))
+            self.c_chess.tag_bind(self.square_items[i], '<Button-1>', lambda e, n=i: self.square_clicked(n))
 
     def get_square_center(self, tag):
-        x0 = self.c_chess.coords(self.c_chess.find_withtag('square_' + tag))[0]
-        y0 = self.c_chess.coords(self.c_chess.find_withtag('square_' + tag))[1]
-        x1 = self.c_chess.coords(self.c_chess.find_withtag('square_' + tag))[2]
-        y1 = self.c_chess.coords(self.c_chess.find_withtag('square_' + tag))[3]
-        xc = (x0 + x1) / 2
-        yc = (y0 + y1) / 2
-        return xc, yc
+        return self.square_centers[tag]
+
+    def move_piece_item(self, pos1, pos2):  # updates the piece index, the canvas item is moved by the caller
+        piece = self.shown_board[SQUARE_INDEX[pos1]]
+        item = self.remove_piece_item(pos1)
+        self.remove_piece_item(pos2)
+        self.place_piece_item(item, pos2, piece)
+        return item
+
+    def remove_piece_item(self, pos):  # returns the removed item, None if the square was empty
+        item = self.piece_items.pop(pos, None)
+        if item is not None:
+            del self.piece_squares[item]
+            self.shown_board[SQUARE_INDEX[pos]] = EMPTY
+        return item
+
+    def place_piece_item(self, item, pos, piece):
+        self.piece_items[pos] = item
+        self.piece_squares[item] = pos
+        self.shown_board[SQUARE_INDEX[pos]] = piece
 
     @staticmethod
     def txt_map_piece(txt):
@@ -497,553 +546,277 @@ class GameWindow:
             return self.piece_color['dark'], self.piece_color['dark_hl']
 
     def draw_pieces(self):
-        def drawing(pos, color):
-            if self.chess_board[pos][1] == 'T':
-                tag = ('piece', color, 'piece_' + pos, 'T')
+        self.render_position(0)
+
+    def draw_piece(self, pos):
+        color = self.chess_board[pos][0]
+        item = self.c_chess.create_text(
+            self.get_square_center(pos),
+            text=self.txt_map_piece(self.chess_board[pos][1]),
+            tag=('piece', color),
+            fill=self.txt_map_color(color)[0],
+            activefill=self.txt_map_color(color)[1],
+            font=(self.font['type'], self.piece_size))
+        self.place_piece_item(item, pos, self.chess_board.board[SQUARE_INDEX[pos]])
+        # bound to the item, which looks up its current square, so moves don't need to retag pieces
+        self.c_chess.tag_bind(item, '<Button-1>', lambda e: self.square_clicked(self.piece_squares[item]))
+        # Button-3 for Castling context menu
+        self.c_chess.tag_bind(item, '<Button-3>', lambda e: self.castling_context(e, self.piece_squares[item]))
+
+    def render_position(self, speed):
+        """Turns the difference of the shown board and the rules board into one batch of canvas changes.
+
+        Only the changed squares are visited. Pieces that changed square keep their items and slide in speed ms, the
+        items of vanished pieces are reused for the new ones, and only what is left over is created or deleted.
+        """
+        board = self.chess_board.board
+        dirty = [sq for sq in range(64) if self.shown_board[sq] != board[sq]]
+        vacated = {}  # square -> (piece, item) of the pieces gone from there
+        for sq in dirty:
+            if self.shown_board[sq] != EMPTY:
+                vacated[sq] = (self.shown_board[sq], self.remove_piece_item(SQUARE_NAMES[sq]))
+        self.animator.begin()
+        restyled = []
+        for sq in dirty:  # moved pieces first, so they aren't restyled into something else
+            if board[sq] != EMPTY:
+                origin = next((origin for origin, (piece, _) in vacated.items() if piece == board[sq]), None)
+                if origin is None:
+                    restyled.append(sq)
+                else:
+                    self.render_piece_item(vacated.pop(origin)[1], origin, sq, speed)
+        for sq in restyled:
+            origin = sq if sq in vacated else next(iter(vacated), None)  # preferably the item of the same square
+            if origin is None:
+                self.draw_piece(SQUARE_NAMES[sq])
             else:
-                tag = ('piece', color, 'piece_' + pos)
-            self.c_chess.create_text(
-                self.get_square_center(pos),
-                text=self.txt_map_piece(self.chess_board[pos][1]),
-                tag=tag,
-                fill=self.txt_map_color(color)[0],
-                activefill=self.txt_map_color(color)[1],
-                font=(self.font['type'], self.piece_size))
-
-        for i in self.chess_board_keys:
-            if self.chess_board[i] != '  ':
-                if self.chess_board[i][0] == 'w':
-                    drawing(i, 'w')
-                elif self.chess_board[i][0] == 'b':
-                    drawing(i, 'b')
-            # all tags has to be bound, otherwise not able to move piece after initial move
-            self.c_chess.tag_bind('piece_' + i, '<Button-1>', lambda e, n=i: self.currently_selected.set(n))
-            # Button-3 for Castling context menu
-            self.c_chess.tag_bind('piece_' + i, '<Button-3>', lambda e, n=i: self.castling_context(e, n))
+                item = vacated.pop(origin)[1]
+                code = LEGACY_CODES[board[sq]]
+                self.animator.configure(self.c_chess, item, 0, text=self.txt_map_piece(code[1]), tag=('piece', code[0]),
+                                        fill=self.txt_map_color(code[0])[0], activefill=self.txt_map_color(code[0])[1])
+                self.render_piece_item(item, origin, sq, speed)
+        for _, item in vacated.values():
+            self.animator.schedule(0, lambda item=item: self.c_chess.delete(item))
+
+    def render_piece_item(self, item, origin, sq, speed):
+        self.place_piece_item(item, SQUARE_NAMES[sq], self.chess_board.board[sq])
+        if origin != sq:
+            self.animator.move(self.c_chess, item, self.get_square_center(SQUARE_NAMES[sq]), 0, speed)
 
     def castling_context(self, e, n):
-        # castling 1. check: only Rooks respond to right click
-        if 'T' in self.c_chess.gettags(self.c_chess.find_withtag(f'piece_{n}')):
-            print('castling requested with: rook_' + str(n))
-            self.king_position = None
-            for i in self.chess_board_keys:
-                if self.chess_board[i] == self.current_player + '+':
-                    self.king_position = i
-            print("current player king position: " + self.king_position)
-            print('These (rook and) king moved so far: ' + str(self.these_rook_king_moved))
-            print('This rook moved: ', end='')
-            print(n in self.these_rook_king_moved)
-            print('This king moved: ', end='')
-            print(self.king_position in self.these_rook_king_moved)
-            self.castling_rook = n
-            # castling 2. check: menu appears only if selected Rook and current player King hasn't moved so far
-            if self.king_position not in self.these_rook_king_moved and n not in self.these_rook_king_moved:
+        # only a rook that can castle now responds to right click, while the man chooses a piece
+        if self.state == 'position1':
+            self.king_position = self.castling_king(n)  # from the legal moves of the position
+            if self.king_position is not None:
+                print('castling requested with: rook_' + str(n))
+                self.castling_rook = n
                 self.c['castling_menu'].post(e.x_root, e.y_root)
 
     def castling(self):
-        def empty_space_between_king_rook():
-            if self.castling_rook[0] == 'h':
-                if self.chess_board['g' + self.castling_rook[1]] == '  ' and \
-                        self.chess_board['f' + self.castling_rook[1]] == '  ':
-                    return True
-            elif self.castling_rook[0] == 'a':
-                if self.chess_board['b' + self.castling_rook[1]] == '  ' and \
-                        self.chess_board['c' + self.castling_rook[1]] == '  ' and \
-                        self.chess_board['d' + self.castling_rook[1]] == '  ':
-                    return True
-            return False
-
-        def king_castling_safe():
-            if self.castling_rook[0] == 'h':
-                if self.coord_danger_from(self.king_position, self.chess_board, self.current_player) or \
-                        self.coord_danger_from('f' + self.king_position[1], self.chess_board, self.current_player) or \
-                        self.coord_danger_from('g' + self.king_position[1], self.chess_board, self.current_player):
-                    return False
-            elif self.castling_rook[0] == 'a':
-                if self.coord_danger_from(self.king_position, self.chess_board, self.current_player) or \
-                        self.coord_danger_from('d' + self.king_position[1], self.chess_board, self.current_player) or \
-                        self.coord_danger_from('c' + self.king_position[1], self.chess_board, self.current_player):
-                    return False
-            return True
-
         def modify_rook_king(color):
-            rook_id = self.c_chess.find_withtag(f'piece_{self.castling_rook}')
+            rook_id = self.piece_items[self.castling_rook]
             self.c_chess.itemconfigure(rook_id, fill=self.txt_map_color(self.current_player)[color])
-            king_id = self.c_chess.find_withtag(f'piece_{self.king_position}')
+            king_id = self.piece_items[self.king_position]
             self.c_chess.itemconfigure(king_id, fill=self.txt_map_color(self.current_player)[color])
             return rook_id, king_id  # also extracts object id
 
-        def get_row_col(color, k_col):
-            if color == 'w':
-                row = str(1)
-            else:
-                row = str(8)
-            if k_col == 'g':
-                r_col = 'f'
-            else:
-                r_col = 'd'
-            return row, r_col
-
-        def backend_castling(color, k_col):
-            self.chess_board[k_col + get_row_col(color, k_col)[0]] = color + '+'
-            self.chess_board[self.king_position] = '  '
-            self.chess_board[get_row_col(color, k_col)[1] + get_row_col(color, k_col)[0]] = color + 'T'
-            self.chess_board[self.castling_rook] = '  '
-            self.these_rook_king_moved.append(k_col + self.king_position[1])
-
-        def gui_castling(color, k_col):  # moving and updating tag
-            self.c_chess.coords(modify_rook_king(0)[0],  # setting color back together with return id
-                                self.get_square_center(get_row_col(color, k_col)[1] + get_row_col(color, k_col)[0]))
-            self.c_chess.coords(modify_rook_king(0)[1],  # setting color back together with return id
-                                self.get_square_center(k_col + get_row_col(color, k_col)[0]))
-            self.c_chess.itemconfigure(self.c_chess.find_withtag(f'piece_{self.castling_rook}'),
-                                       tag=('piece', color,
-                                            'piece_' + get_row_col(color, k_col)[1] + get_row_col(color, k_col)[0],
-                                            'T'))  # update tag of piece
-            self.c_chess.itemconfigure(self.c_chess.find_withtag(f'piece_{self.king_position}'),
-                                       tag=('piece', color,
-                                            'piece_' + k_col + get_row_col(color, k_col)[0]))
-
-        # castling 3. check: castling dialog only appears if squares empty between king and chosen rook
-        if not empty_space_between_king_rook():
-            tk.messagebox.showwarning(title='Castling', message='Piece present between king and chosen rook!')
+        modify_rook_king(1)
+        if self.castling_rook[0] == 'h':
+            message = 'Proceed with kingside castling?'
+            side = 'g'
         else:
-            modify_rook_king(1)
-            if self.castling_rook[0] == 'h':
-                message = 'Proceed with kingside castling?'
-                side = 'g'
-            else:
-                message = 'Proceed with queenside castling?'
-                side = 'c'
-            do_castling = tk.messagebox.askyesno(title='Castling', message=message)
-            if do_castling:
-                # castling 4. check: castling happens only if king not in check during castling
-                if not king_castling_safe():
-                    tk.messagebox.showwarning(title='Illegal move', message='King in check during castling!')
-                    modify_rook_king(0)
-                else:
-                    print('castling with: rook_' + self.castling_rook)
-                    backend_castling(self.current_player, side)
-                    gui_castling(self.current_player, side)
-                    self.en_pass_pos = ['  ', '  ']     # to clear previous en passant possibilities
-                    self.currently_selected.set('exit')  # to bypass anticipated position1 and flip player
-                    self.display_board()
-            else:
-                modify_rook_king(0)
-
-    def en_passant(self, x):
-        if self.current_player2 == 'man':
-            curr_speed = 0
-        else:
-            curr_speed = self.game_speed
-        if self.chess_board[self.position1][1] == 'i' and self.position2 == self.en_pass_pos[0]:
-            first_empty_slot = self.captured_pieces[self.other_player].index('  ')
-            self.captured_pieces[self.other_player][first_empty_slot] = self.chess_board[self.en_pass_pos[1]]
-            # copy captured piece to captured canvas
-            self.master.after(curr_speed * 2, lambda player=self.other_player: self.c['captured'][player].itemconfigure(
-                    self.c['captured'][player].find_withtag('captured_' + str(first_empty_slot)),
-                    text=self.txt_map_piece('i')))
-            # get id of captured piece
-            captured_piece = self.c_chess.find_withtag(f'piece_{self.en_pass_pos[1]}')
-            print('En passant! captured id=' + str(captured_piece))
-            # delete captured piece from chess board
-            self.master.after(curr_speed * 2, lambda: self.c_chess.delete(captured_piece))
-            self.chess_board[self.en_pass_pos[1]] = '  '
-        if x == 'w':
-            if self.chess_board[self.position1][1] == 'i' and self.position1[1] == '2' and self.position2[1] == '4':
-                self.en_pass_pos[0] = self.position2[0] + str(3)
-                self.en_pass_pos[1] = self.position2
-            else:
-                self.en_pass_pos = ['  ', '  ']
-        elif x == 'b':
-            if self.chess_board[self.position1][1] == 'i' and self.position1[1] == '7' and self.position2[1] == '5':
-                self.en_pass_pos[0] = self.position2[0] + str(6)
-                self.en_pass_pos[1] = self.position2
-            else:
-                self.en_pass_pos = ['  ', '  ']
-        if self.en_pass_pos != ['  ', '  ']:
-            print(f'En passant possible for {self.en_pass_pos[1]}, capture at {self.en_pass_pos[0]}')
+            message = 'Proceed with queenside castling?'
+            side = 'c'
+        do_castling = tk.messagebox.askyesno(title='Castling', message=message)
+        modify_rook_king(0)
+        if do_castling:
+            print('castling with: rook_' + self.castling_rook)
+            self.animator.begin()
+            # the king's move, the rules board moves the rook together with it
+            self.show_move(self.play_move(self.king_position, side + self.king_position[1]), self.current_player, 0)
+            self.display_board()
+            self.end_turn()
 
     def display_next_player(self, x):
-        if self.current_player2 == 'man' and self.number_of_player == 1 and self.position1 and \
-                self.currently_selected.get() != 'reset':
-            curr_speed = self.game_speed
-        else:
-            curr_speed = 0
+        self.animator.begin()  # the turn is shown after the animation of the previous move
         if x == 'w':
             print('White is next to move')
-            self.master.after(curr_speed * 2, lambda:
-                              self.c['right_center'].itemconfigure(self.c['current_player_label'],
-                                                                   text='White is next to move'))
+            self.animator.configure(self.c['right_center'], self.c['current_player_label'], 0,
+                                    text='White is next to move')
         elif x == 'b':
             print('Black is next to move')
-            self.master.after(curr_speed * 2, lambda:
-                              self.c['right_center'].itemconfigure(self.c['current_player_label'],
-                                                                   text='Black is next to move'))
-        return curr_speed
+            self.animator.configure(self.c['right_center'], self.c['current_player_label'], 0,
+                                    text='Black is next to move')
 
-    def handle_turn(self, x):
-        # print(self.position1)
+    def handle_turn(self, x):  # the man's turn starts with choosing a piece, see square_clicked
+        self.state = 'position1'
         self.selected_piece = None
-        curr_speed = self.display_next_player(x)    # also returns current game speed
+        self.display_next_player(x)
         self.c_chess.itemconfigure('piece', state=tk.DISABLED)  # initialize select piece
         self.c_chess.itemconfigure('square', state=tk.DISABLED)
-        self.master.after(curr_speed * 2, lambda: self.c_chess.itemconfigure(x, state=tk.NORMAL))
+        self.legal_targets = self.turn_targets()  # every legal move of the turn, computed once
+        self.animator.schedule(0, self.enable_movable_pieces)
         print('waiting for position1')
-        self.c_chess.wait_variable(self.currently_selected)
-        if self.currently_selected.get() != 'exit':  # if user didn't close program meanwhile
-            self.position1 = self.currently_selected.get()
-            print('position1=' + self.position1)
-            self.selected_piece = self.c_chess.find_withtag(f'piece_{self.position1}')  # get id of selected piece
-            print('id=' + str(self.selected_piece[0]))
-            self.c_chess.itemconfigure(self.selected_piece, fill=self.txt_map_color(x)[1])  # set constant red
-
-            self.c_chess.itemconfigure('piece', state=tk.DISABLED)  # initialize select square
-            valid_position2s = self.generate_valid_position2(x)  # activate only valid movement squares
-            if self.show_legal_moves_man.get():
-                color_number = 2
-            else:
-                color_number = 0
-            for i in valid_position2s:
-                self.c_chess.itemconfigure('square_' + i, state=tk.NORMAL, fill=self.pos_map_color(i)[color_number])
-
-            print('waiting for position2')
-            # in this timeframe there's possibility to reset selection
-            self.c_chess.wait_variable(self.currently_selected)
-
-            if self.selected_piece is not None and self.currently_selected.get() != 'exit':
-                self.position2 = self.currently_selected.get()
-                print('position2=' + self.position2)
-
-                if not self.virtual_move_results_check(x):
-                    self.en_passant(self.current_player)
-                    # if capture happens
-                    if self.chess_board[self.position2] != '  ':
-                        first_empty_slot = self.captured_pieces[self.other_player].index('  ')
-                        # backend, copying position2 piece to other player's captured list
-                        self.captured_pieces[self.other_player][first_empty_slot] = self.chess_board[self.position2]
-                        # copy captured piece to captured canvas
-                        self.c['captured'][self.other_player].itemconfigure(
-                            self.c['captured'][self.other_player].find_withtag('captured_' + str(first_empty_slot)),
-                            text=self.txt_map_piece(self.chess_board[self.position2][1]))
-                        # get id of captured piece
-                        captured_piece = self.c_chess.find_withtag(f'piece_{self.position2}')
-                        print('Capture! captured id=' + str(captured_piece))
-                        # delete captured piece from chess board
-                        self.c_chess.delete(captured_piece)
-
-                    # register first move of rook and king for castling
-                    if self.chess_board[self.position1][1] == '+' or self.chess_board[self.position1][1] == 'T':
-                        self.these_rook_king_moved.append(self.position2)
-                        if self.position1 in self.these_rook_king_moved:
-                            self.these_rook_king_moved.remove(self.position1)
-
-                    # backend, moving piece in the chess dictionary
-                    self.chess_board[self.position2] = self.chess_board[self.position1]
-                    self.chess_board[self.position1] = '  '
-                    self.c_chess.coords(self.selected_piece, self.get_square_center(self.position2))  # moving piece
-                    self.c_chess.itemconfigure(self.selected_piece, fill=self.txt_map_color(x)[0])  # set original color
-                    print('old tags=' + str(self.c_chess.gettags(self.selected_piece)))
-                    self.c_chess.dtag(self.selected_piece, f'piece_{self.position1}')  # update tag of piece
-                    self.c_chess.addtag(f'piece_{self.position2}', 'withtag', self.selected_piece)
-                    print('new tags=' + str(self.c_chess.gettags(self.selected_piece)))
-                    for i in valid_position2s:  # set squares to original color
-                        self.c_chess.itemconfigure('square_' + i, fill=self.pos_map_color(i)[0])
-                else:
-                    tk.messagebox.showwarning(title='Illegal move',
-                                              message='Movement leaves or places the king in check!')
-                    self.reset_selection()
-                self.c_chess.itemconfigure('square', state=tk.DISABLED)
-                self.display_board()
-
-    def computer_turn(self, x):
-        values = {'+': 10, '*': 9, 'T': 5, 'A': 3, 'f': 3, 'i': 1}
-        ops = {'>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le}
-
-        def rank_piece_dgr(d_dict):  # returns coordinates of pieces in d_dict ranked in descending values
-            val_assign_piece_dgr = {key: values[d_dict[key][1]] for key in d_dict}
-            ranked_piece_dgr = \
-                [piece for i in range(10, 0, -1) for piece in val_assign_piece_dgr if i == val_assign_piece_dgr[piece]]
-            return ranked_piece_dgr
-
-        def attack_worth(dictionary, comp):
-            if len(self.piece_dgr[dictionary]) == 1 or dictionary == 'oth':
-                if ops[comp](values[self.chess_board[self.position1][1]],
-                             values[self.chess_board[self.position2][1]]):
-                    return True
-            else:
-                if ops[comp](values[self.chess_board[self.position1][1]],
-                             values[self.piece_dgr[dictionary][rank_piece_dgr(self.piece_dgr[dictionary])[0]][1]]):
-                    return True
-            return False
-
-        def piece_dgr_values_check(board1, board2, player, comp):
-            dgr_values_before = [values[board1[i][1]] for i in self.chess_board_keys if board1[i][0] == player and
-                                 self.coord_danger_from(i, board1, player)]
-            dgr_values_after = [values[board2[i][1]] for i in self.chess_board_keys if board2[i][0] == player and
-                                self.coord_danger_from(i, board2, player)]
-            # print(dgr_values_before, end=',')
-            # print(dgr_values_after, end=',')
-            # print(player + ',' + str(ops[comp](sum(dgr_values_before), sum(dgr_values_after))))
-            return {'r': ops[comp](sum(dgr_values_before), sum(dgr_values_after)),
-                    'b': sum(dgr_values_before), 'a': sum(dgr_values_after)}
-
-        def measure_dist(pos1, pos2):
-            x_dist = abs(ord(pos2[0]) - ord(pos1[0]))
-            y_dist = abs(int(pos2[1]) - int(pos1[1]))
-            dist = (x_dist ** 2 + y_dist ** 2) ** 0.5
-            return float(round(dist, 1))
 
+    def square_clicked(self, name):  # pieces and squares are only enabled while they can be chosen
+        if self.state == 'position1':
+            self.select_piece(name)
+        elif self.state == 'position2':
+            self.select_square(name)
+
+    def select_piece(self, name):
+        if not self.legal_targets.get(name):  # a rook that can only castle, it is enabled for its right click menu
+            return
+        self.state = 'position2'
+        self.position1 = name
+        print('position1=' + self.position1)
+        self.selected_piece = self.piece_items[self.position1]  # get id of selected piece
+        print('id=' + str(self.selected_piece))
+        self.c_chess.itemconfigure(self.selected_piece, fill=self.txt_map_color(self.current_player)[1])  # red
+
+        self.c_chess.itemconfigure('piece', state=tk.DISABLED)  # initialize select square
+        if self.show_legal_moves_man.get():
+            color_number = 2
+        else:
+            color_number = 0
+        for i in self.legal_targets.get(self.position1, []):  # activate only legal movement squares
+            self.c_chess.itemconfigure(self.square_items[i], state=tk.NORMAL, fill=self.pos_map_color(i)[color_number])
+        print('waiting for position2')  # in this timeframe there's possibility to reset selection
+
+    def select_square(self, name):
+        self.state = 'idle'
+        self.position2 = name
+        print('position2=' + self.position2)
+        self.animator.begin()
+        self.show_move(self.play_move(self.position1, self.position2), self.current_player, 0)
+        for i in self.legal_targets.get(self.position1, []):  # set squares to original color
+            self.c_chess.itemconfigure(self.square_items[i], fill=self.pos_map_color(i)[0])
+        self.c_chess.itemconfigure('square', state=tk.DISABLED)
+        self.display_board()
+        if self.promotion_coordinate(self.current_player):
+            self.promotion_dialog(self.current_player)  # the turn ends when a piece is chosen
+        else:
+            self.end_turn()
+
+    def show_move(self, effects, x, speed):
+        """Canvas side of play_move: the piece turns red, slides and turns back, speed is 0 for the man's moves."""
+        if effects.captured_at:
+            color = effects.captured[0]
+            self.animator.configure(self.c['captured'][color], self.captured_items[color][effects.captured_slot],
+                                    speed * 2, text=self.txt_map_piece(effects.captured[1]))
+            self.captured_codes[color][effects.captured_slot] = effects.captured
+            captured_piece = self.remove_piece_item(effects.captured_at)
+            print('Capture! captured id=' + str(captured_piece))
+            self.animator.schedule(speed * 2, lambda: self.c_chess.delete(captured_piece))
+        if effects.rook_from:
+            rook_piece = self.move_piece_item(effects.rook_from, effects.rook_to)
+            self.animator.move(self.c_chess, rook_piece, self.get_square_center(effects.rook_to), speed, speed)
+        piece = self.move_piece_item(effects.position1, effects.position2)  # get id and update the piece index
+        print('Move with id=' + str(piece))
+        self.animator.configure(self.c_chess, piece, speed, fill=self.txt_map_color(x)[1])  # set red
+        self.animator.move(self.c_chess, piece, self.get_square_center(effects.position2), speed, speed)
+        self.animator.configure(self.c_chess, piece, speed * 2, fill=self.txt_map_color(x)[0])  # set original color
+
+    def enable_movable_pieces(self):  # pieces without a legal move stay disabled, they can't be selected
+        for name in self.legal_targets:
+            self.c_chess.itemconfigure(self.piece_items[name], state=tk.NORMAL)
+
+    def computer_turn(self, x):  # the turn goes on in computer_move when the search is done
+        self.state = 'computer'
         self.display_next_player(x)
-        strategy = 'None'
-        strategy_found = False
-        print("It's computer's turn. Analyzing chess board...")
-        curr_player_pos = [i for i in self.chess_board_keys if self.chess_board[i][0] == x]
-        print("Computer's pieces standing on: " + str(curr_player_pos))
-        self.piece_dgr['cur'] = \
-            {i: self.chess_board[i] for i in curr_player_pos if self.coord_danger_from(i, self.chess_board, x)}
-        print("Computer's pieces under attack: " + str(self.piece_dgr['cur']))
-        if self.piece_dgr['cur']:  # if under attack: strategies (1, 2, 3, 4)
-            print('Pieces in danger ranked: ' + str(rank_piece_dgr(self.piece_dgr['cur'])))
-            for cur_pos in rank_piece_dgr(self.piece_dgr['cur']):   # iterates through the ordered list of pieces in dgr
-                # identifies the present piece's attacker and attacks it
-                self.position2 = self.coord_danger_from(cur_pos, self.chess_board, x)
-                # seeks a legal move to capture the attacker on a safe place (1st)
-                for self.position1 in curr_player_pos:
-                    if self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                            not self.coord_danger_from(self.position2, self.chess_board, x):
-                        strategy_found = True
-                        strategy = '1: Defense attack to safe place'
-                        break
-                else:
-                    # if not found, it tries to capture the attacker on a non-safe place if attack worth (2nd)
-                    for self.position1 in curr_player_pos:
-                        if self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                                attack_worth('cur', '<'):
-                            strategy_found = True
-                            strategy = '2: Defense attack to non-safe place if worth it (loosing lower value piece)'
-                            break
-                    else:
-                        # if not found, it tries to retreat from the threatened coordinate (it checks virtual movement
-                        # as well due to possible blocking of attacker on current position) so that the sum of values
-                        # of pieces in danger don't increase (3rd)
-                        self.position1 = cur_pos
-                        randomized_chess_board_keys = random.sample(self.chess_board_keys, len(self.chess_board_keys))
-                        for self.position2 in randomized_chess_board_keys:
-                            if self.chess_board[self.position2] not in \
-                                    [x + 'T', x + 'f', x + 'A', x + '+', x + '*', x + 'i'] \
-                                    and self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                                    not self.coord_danger_from(self.position2, self.chess_board_virtual, x) and \
-                                    not self.move_danger_from_en_passant(self.chess_board) and \
-                                    piece_dgr_values_check(self.chess_board, self.chess_board_virtual, x, '>=')['r']:
-                                strategy_found = True
-                                strategy = '3: Retreating to safe place'
-                                break
-                        else:
-                            # if not found, it tries once more to capture the attacker on a non-safe place if attack
-                            # worth, but this time losing a same value piece is accepted (4th)
-                            self.position2 = self.coord_danger_from(cur_pos, self.chess_board, x)
-                            for self.position1 in curr_player_pos:
-                                if self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                                        attack_worth('cur', '<='):
-                                    strategy_found = True
-                                    strategy = '4: Defense attack to non-safe place if worth it ' \
-                                               '(loosing same value piece)'
-                                    break
-                            else:
-                                continue
-                break
-        # the following was moved out of if statement, due later usage and medium warning
-        oth_player_pos = [i for i in self.chess_board_keys if self.chess_board[i][0] == self.other_player]
-        if not strategy_found:  # if not under attack or move not found, it tries to attack (5, 6, 7)
-            print("Opponent's pieces standing on: " + str(oth_player_pos))
-            self.piece_dgr['oth'] = {i: self.chess_board[i] for i in oth_player_pos if
-                                     self.coord_danger_from(i, self.chess_board, self.other_player)}
-            print("Opponent's pieces under attack: " + str(self.piece_dgr['oth']))
-            if self.piece_dgr['oth']:
-                # iterates through the ordered list of other player's pieces in danger
-                for oth_pos in rank_piece_dgr(self.piece_dgr['oth']):
-                    # it checks which current player piece endangers the present other player's piece
-                    self.position1 = self.coord_danger_from(oth_pos, self.chess_board, self.other_player)
-                    self.position2 = oth_pos    # tries to attack to safe place (5th)
-                    if self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                            not self.coord_danger_from(self.position2, self.chess_board, x):
-                        strategy_found = True
-                        strategy = '5: Attack to safe place'
-                        break
-                    # if not managed, it still tries the attack if it worth (6th)
-                    elif self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                            attack_worth('oth', '<'):
-                        strategy_found = True
-                        strategy = '6: Attack to non-safe place if worth it'
-                        break
-        # if not under attack or move not found, it tries the en passant capture (7th)
-        if not strategy_found and self.en_pass_pos[0] != '  ':
-            self.position1 = self.coord_danger_from(self.en_pass_pos[0], self.chess_board, self.other_player)
-            if self.position1 and self.chess_board[self.position1][1] == 'i':
-                self.position2 = self.en_pass_pos[0]
-                strategy_found = True
-                strategy = '7: Attack with En passant'
-        # if not under attack or previous moves not found, it tries to move to safe place towards opponent's king
-        # so that the sum of values of current pieces in danger don't increase, but the opponent's value increases
-        # as much as possible (8th)
-        if not strategy_found:
-            safe_position2s = [i for i in self.chess_board_keys if not self.coord_danger_from(i, self.chess_board, x)
-                               and self.chess_board[i] not in [x + 'T', x + 'f', x + 'A', x + '+', x + '*', x + 'i']]
-            oth_king_pos = None
-            for i in self.chess_board_keys:
-                if self.chess_board[i] == self.other_player + '+':
-                    oth_king_pos = i
-            dist_add_pos2s = {pos: measure_dist(oth_king_pos, pos) for pos in safe_position2s}
-            dist_ordered_pos2s = [pos for i in range(1, 101) for pos in dist_add_pos2s if dist_add_pos2s[pos] == i / 10]
-            randomized_curr_player_pos = random.sample(curr_player_pos, len(curr_player_pos))
-            # now it checks if strategy 8 is needed, otherwise only draw happens
-            oth_values_before = sum([values[self.chess_board[i][1]] for i in oth_player_pos])
-            if oth_values_before > 13:
-                eight = {}
-                for self.position1 in randomized_curr_player_pos:
-                    for self.position2 in dist_ordered_pos2s:
-                        if self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                                piece_dgr_values_check(self.chess_board, self.chess_board_virtual, x, '>=')['r'] and \
-                                not self.move_danger_from_en_passant(self.chess_board):
-                            eight[(self.position1, self.position2)] = piece_dgr_values_check(   # value assign to moves
-                                self.chess_board, self.chess_board_virtual, self.other_player, '<')['a']
-                sorted_eight = sorted(eight.items(), key=lambda i: i[1], reverse=True)
-                # if eight still empty, returns []
-                if sorted_eight and sorted_eight[0][1] > piece_dgr_values_check(    # if greatest value after > before
-                        self.chess_board, self.chess_board_virtual, self.other_player, '<')['b']:
-                    strategy_found = True
-                    strategy = '8: Move to safe place, try to prepare future attack'
-                    self.position1 = sorted_eight[0][0][0]
-                    self.position2 = sorted_eight[0][0][1]
-                # print(sorted_eight)
-            else:
-                print('Strategy 8 deactivated due to low threat from opponent')
-            # tries once more, but without increasing the the sum of value of the opponent's pieces in danger (9th)
-            if not strategy_found:
-                for self.position1 in randomized_curr_player_pos:
-                    for self.position2 in dist_ordered_pos2s:
-                        if self.check_legal_move() and not self.virtual_move_results_check(x) and \
-                                piece_dgr_values_check(self.chess_board, self.chess_board_virtual, x, '>=')['r'] and \
-                                not self.move_danger_from_en_passant(self.chess_board):
-                            strategy_found = True
-                            strategy = '9: Move to safe place'
-                            break
-                    else:
-                        continue
-                    break
-        # if previous strategies failed, it tries any legal move (10th)
-        if not strategy_found:
-            randomized_curr_player_pos = random.sample(curr_player_pos, len(curr_player_pos))
-            randomized_chess_board_keys = random.sample(self.chess_board_keys, len(self.chess_board_keys))
-            for self.position1 in randomized_curr_player_pos:
-                for self.position2 in randomized_chess_board_keys:
-                    if self.chess_board[self.position2] not in [x + 'T', x + 'f', x + 'A', x + '+', x + '*', x + 'i'] \
-                            and self.check_legal_move() and not self.virtual_move_results_check(x):
-                        strategy = '10: Make any legal move'
-                        break
-                else:
-                    continue
-                break
-        print('Strategy ' + strategy)
+        move = self.book.choose(self.chess_board) if self.book is not None and self.use_book.get() else 0
+        if move:
+            print("It's computer's turn. Book move, no search.")
+            self.search_results = queue.Queue()  # delivered like a search result, after the previous move is shown
+            self.search_results.put(SearchResult(move, 0, 0, 0, 0.0))
+            self.master.after_idle(self.poll_search, self.search_results)
+        else:
+            print("It's computer's turn. Searching...")
+            self.start_search()
+
+    def computer_move(self, result):
+        x = self.current_player
+        self.state = 'idle'
+        self.position1 = SQUARE_NAMES[move_from(result.move)]
+        self.position2 = SQUARE_NAMES[move_to(result.move)]
+        self.animator.begin()  # the move is animated from now on, poll_search waited for the previous one
+        if result.nodes:  # a searched move, not one of the opening book or an endgame table
+            print(f'Search depth {result.depth}, score {result.score}, {result.nodes} nodes in {result.seconds:.2f}s')
+            stats = self.engine.tt.stats()
+            print(f"Hash table {stats['size_mb']} MB: hit rate {stats['hit_rate']:.1%}, "
+                  f"{stats['hashfull']} permille full")
         print('Moving from: ' + self.position1)
         print('Moving to: ' + self.position2)
-        self.en_passant(x)
-        if self.chess_board[self.position2] != '  ':
-            captured = self.chess_board[self.position2]
-            first_empty_slot = self.captured_pieces[self.other_player].index('  ')
-            self.captured_pieces[self.other_player][first_empty_slot] = self.chess_board[self.position2]
-            self.master.after(
-                self.game_speed * 2, lambda player=self.other_player:
-                self.c['captured'][player].itemconfigure(
-                    self.c['captured'][player].find_withtag('captured_' + str(first_empty_slot)),
-                    text=self.txt_map_piece(captured[1])))
-            captured_piece = self.c_chess.find_withtag(f'piece_{self.position2}')
-            print('Capture! captured id=' + str(captured_piece))
-            self.master.after(self.game_speed * 2, lambda: self.c_chess.delete(captured_piece))
-
         if self.show_legal_moves_computer.get():
-            position2 = self.position2
-            valid_position2s = self.generate_valid_position2(x)
-            for i in valid_position2s:
-                self.master.after(self.game_speed, lambda pos=i: self.c_chess.itemconfigure(
-                    'square_' + pos, fill=self.pos_map_color(pos)[2]))
-                self.master.after(self.game_speed * 2, lambda pos=i: self.c_chess.itemconfigure(
-                    'square_' + pos, fill=self.pos_map_color(pos)[0]))
-            self.position2 = position2
-
-        self.chess_board[self.position2] = self.chess_board[self.position1]
-        self.chess_board[self.position1] = '  '
-        selected_piece = self.c_chess.find_withtag(f'piece_{self.position1}')  # get id of selected piece
-        print('Move with id=' + str(selected_piece[0]))
-        self.master.after(self.game_speed,
-                          lambda: self.c_chess.itemconfigure(selected_piece, fill=self.txt_map_color(x)[1]))  # set red
-        self.master.after(self.game_speed * 2,
-                          lambda pos=self.position2: self.c_chess.coords(selected_piece, self.get_square_center(pos)))
-        self.master.after(self.game_speed * 2,
-                          lambda: self.c_chess.itemconfigure(selected_piece, fill=self.txt_map_color(x)[0]))  # set orig
-        print('old tags=' + str(self.c_chess.gettags(selected_piece)))
-        self.c_chess.dtag(selected_piece, f'piece_{self.position1}')  # update tag of piece
-        self.c_chess.addtag(f'piece_{self.position2}', 'withtag', selected_piece)
-        print('new tags=' + str(self.c_chess.gettags(selected_piece)))
+            for i in self.valid_position2s(self.position1):
+                self.animator.configure(self.c_chess, self.square_items[i], self.game_speed,
+                                        fill=self.pos_map_color(i)[2])
+                self.animator.configure(self.c_chess, self.square_items[i], self.game_speed * 2,
+                                        fill=self.pos_map_color(i)[0])
+        self.show_move(self.play_move(self.position1, self.position2), x, self.game_speed)
         self.display_board()
+        if self.promotion_coordinate(x):
+            self.computer_promotion(x, SAVE_LETTERS[move_promotion(result.move)])
+        self.end_turn()
+
+    def start_search(self):
+        """Starts the engine in a worker thread on a copy of the board, the move comes back through a queue."""
+        self.stop_search()
+        self.search_results = queue.Queue()
+        board = self.chess_board.copy()  # the gui may read or save the board while the engine plays on it
+        self.search_thread = threading.Thread(
+            target=lambda results=self.search_results: results.put(self.engine.search(board)), daemon=True)
+        self.search_thread.start()
+        self.master.after(50, self.poll_search, self.search_results)
+
+    def poll_search(self, results):
+        if results is not self.search_results:  # search of a game that was left meanwhile
+            return
+        if results.empty() or self.animator.busy():  # the move is played when the previous one has been shown
+            self.master.after(50, self.poll_search, results)
+        else:
+            self.search_results = None
+            self.computer_move(results.get_nowait())
+
+    def stop_search(self):
+        self.search_results = None
+        if self.search_thread is not None:
+            while self.search_thread.is_alive():
+                self.engine.stop()  # repeated in case the search has not started yet
+                self.search_thread.join(0.05)
+            self.search_thread = None
 
     def reset_selection(self):
-        if self.selected_piece is not None:
+        if self.state == 'position2' and self.selected_piece is not None:
             print('resetting selected piece')
-            self.c_chess.itemconfigure(self.selected_piece, fill=self.txt_map_color(self.current_player)[0])
-            self.selected_piece = None
-            for i in self.generate_valid_position2(self.current_player):
-                self.c_chess.itemconfigure('square_' + i, fill=self.pos_map_color(i)[0])
-            self.currently_selected.set('reset')  # substitute anticipated position2 with a reset flag
+            self.unselect_piece()
+            self.handle_turn(self.current_player)  # the same turn starts again
         else:
             print('no piece to reset')
 
-    def flip_player(self):
-        if self.currently_selected.get() != 'reset':
-            if self.current_player == 'w':
-                self.current_player = 'b'
-                self.other_player = 'w'
-            elif self.current_player == 'b':
-                self.current_player = 'w'
-                self.other_player = 'b'
-            if (self.number_of_player == 1 and self.current_player2 == 'man') or \
-                    self.number_of_player == 0:
-                self.current_player2 = 'computer'
-            elif (self.number_of_player == 1 and self.current_player2 == 'computer') or \
-                    self.number_of_player == 2:
-                self.current_player2 = 'man'
-        else:
-            print('reset or check condition, not flipping player')
-
-    def generate_valid_position2(self, x):
-        valid_position2 = []
-        for k in self.chess_board_keys:
-            self.position2 = k
-            if self.check_legal_move() and \
-                    self.chess_board[self.position2] not in [x + 'T', x + 'f', x + 'A', x + '+', x + '*', x + 'i']:
-                valid_position2.append(k)
-        return valid_position2
-
-    def promotion_coordinate(self, x):
-        if x == 'w':
-            for i in self.chess_board_keys[0: 8]:  # a8-h8
-                if self.chess_board[i] == 'wi':
-                    return i
-        elif x == 'b':
-            for i in self.chess_board_keys[56: 65]:  # a1-h1
-                if self.chess_board[i] == 'bi':
-                    return i
+    def unselect_piece(self):
+        self.c_chess.itemconfigure(self.selected_piece, fill=self.txt_map_color(self.current_player)[0])
+        self.selected_piece = None
+        for i in self.legal_targets.get(self.position1, []):
+            self.c_chess.itemconfigure(self.square_items[i], fill=self.pos_map_color(i)[0])
 
     def promotion_dialog(self, x):
+        def select():
+            promotion_window.destroy()
+            promotion_piece = self.piece_items[self.promotion_coordinate(x)]
+            coordinate = self.promote(x, button_value.get())  # set backend
+            self.shown_board[SQUARE_INDEX[coordinate]] = self.chess_board.board[SQUARE_INDEX[coordinate]]
+            self.c_chess.itemconfigure(promotion_piece, text=self.txt_map_piece(button_value.get()))  # set frontend
+            self.display_board()
+            self.end_turn()
+
+        self.state = 'promotion'
         button_value = tk.StringVar(value='*')
-        promotion_selected = tk.BooleanVar()
 
-        promotion_window = tk.Toplevel(self.master)
+        promotion_window = self.c['promotion_window'] = tk.Toplevel(self.master)
         promotion_window.focus_set()
         promotion_window.title('Promotion')
         promotion_window.resizable(False, False)
-        promotion_window.protocol("WM_DELETE_WINDOW", lambda: promotion_selected.set(True))
+        promotion_window.protocol("WM_DELETE_WINDOW", select)
 
         promotion_frame = ttk.Frame(promotion_window, padding=10)
         promotion_frame.grid(column=0, row=0, sticky='n, w, e, s')
@@ -1059,271 +832,41 @@ class GameWindow:
         for piece, col in [('*', 0), ('T', 1), ('A', 2), ('f', 3)]:
             buttons[piece].grid(column=col, row=1, sticky='n, w, e, s')
 
-        ok_button = ttk.Button(promotion_frame, text='Select', command=lambda: promotion_selected.set(True))
+        ok_button = ttk.Button(promotion_frame, text='Select', command=select)
         ok_button.grid(column=3, row=2, sticky='n, w, e, s')
 
-        self.master.wait_variable(promotion_selected)
-        promotion_window.destroy()
-
-        self.chess_board[self.promotion_coordinate(x)] = x + button_value.get()  # set backend
-        self.c_chess.itemconfigure(self.selected_piece, text=self.txt_map_piece(button_value.get()))  # set frontend
+    def computer_promotion(self, x, piece):  # piece is the letter of the save file, as chosen by the engine
+        promotion_piece = self.piece_items[self.promotion_coordinate(x)]
+        self.animator.configure(self.c_chess, promotion_piece, self.game_speed * 2, text=self.txt_map_piece(piece))
+        coordinate = self.promote(x, piece)
+        self.shown_board[SQUARE_INDEX[coordinate]] = self.chess_board.board[SQUARE_INDEX[coordinate]]
         self.display_board()
 
-    def computer_promotion(self, x):
-        promotion_piece = self.c_chess.find_withtag(f'piece_{self.promotion_coordinate(x)}')
-        self.master.after(self.game_speed * 2,
-                          lambda: self.c_chess.itemconfigure(promotion_piece, text=self.txt_map_piece('*')))
-        self.chess_board[self.promotion_coordinate(x)] = x + '*'
-        print('Promotion occurred. ' + x + 'i became ' + x + '*.')
-        self.display_board()
-
-    def check_legal_move(self):
-        if self.chess_board[self.position1][1] == 'T':  # Rook
-            if self.check_movement_cols_rows() and self.check_obstacle_cols_rows():
-                return True
-        if self.chess_board[self.position1][1] == 'A':  # Bishop
-            if self.check_movement_diagonals() and self.check_obstacle_diagonals():
-                return True
-        if self.chess_board[self.position1][1] == '*':  # Queen
-            if (self.check_movement_cols_rows() or self.check_movement_diagonals()) \
-                    and (self.check_obstacle_cols_rows() or self.check_obstacle_diagonals()):
-                return True
-        if self.chess_board[self.position1][1] == '+':  # King
-            if abs(ord(self.position2[0]) - ord(self.position1[0])) < 2 and \
-                    abs(int(self.position2[1]) - int(self.position1[1])) < 2:
-                return True
-        if self.chess_board[self.position1][1] == 'f':  # Knight
-            if (abs(ord(self.position2[0]) - ord(self.position1[0])) == 1 and
-                abs(int(self.position2[1]) - int(self.position1[1])) == 2) or \
-                    (abs(ord(self.position2[0]) - ord(self.position1[0])) == 2 and
-                     abs(int(self.position2[1]) - int(self.position1[1])) == 1):
-                return True
-        if self.chess_board[self.position1] == 'wi':  # Pawn white
-            if self.move_one_capture_side_one(-1) or self.first_move_two(2, 3, -2):
-                return True
-        if self.chess_board[self.position1] == 'bi':  # Pawn black
-            if self.move_one_capture_side_one(1) or self.first_move_two(7, 6, 2):
-                return True
-        return False
-
-    def check_movement_cols_rows(self):
-        if self.position1[0] == self.position2[0] or self.position1[1] == self.position2[1]:
-            return True
-        return False
-
-    def check_movement_diagonals(self):
-        if abs(ord(self.position1[0]) - ord(self.position2[0])) == \
-                abs(int(self.position1[1]) - int(self.position2[1])):
-            return True
-        return False
-
-    def check_obstacle_cols_rows(self):
-        if self.position1[0] == self.position2[0]:
-            for i in range(1, abs(int(self.position2[1]) - int(self.position1[1]))):
-                if self.chess_board[self.position1[0] + str(min(int(self.position1[1]),
-                                                                int(self.position2[1])) + i)] != '  ':
-                    return False
-            return True
-        elif self.position1[1] == self.position2[1]:
-            for i in range(1, abs(ord(self.position2[0]) - ord(self.position1[0]))):
-                if self.chess_board[chr(min(ord(self.position1[0]),
-                                            ord(self.position2[0])) + i) + self.position1[1]] != '  ':
-                    return False
-            return True
-
-    def check_obstacle_diagonals(self):
-        if ord(self.position1[0]) - ord(self.position2[0]) == int(self.position1[1]) - int(self.position2[1]):
-            for i in range(1, abs(int(self.position2[1]) - int(self.position1[1]))):
-                if self.chess_board[chr(min(ord(self.position1[0]), ord(self.position2[0])) + i) +
-                                    str(min(int(self.position1[1]), int(self.position2[1])) + i)] != '  ':
-                    return False
-            return True
-        elif ord(self.position1[0]) - ord(self.position2[0]) == (int(self.position1[1]) - int(self.position2[1])) * -1:
-            for i in range(1, abs(int(self.position2[1]) - int(self.position1[1]))):
-                if self.chess_board[chr(min(ord(self.position1[0]), ord(self.position2[0])) + i) +
-                                    str(max(int(self.position1[1]), int(self.position2[1])) - i)] != '  ':
-                    return False
-            return True
-
-    def move_one_capture_side_one(self, dct1):  # direction up if -1, down if 1
-        if self.chess_board[self.position2] == '  ':
-            if self.position2 == self.en_pass_pos[0] and \
-                    abs(ord(self.position2[0]) - ord(self.position1[0])) == 1 and \
-                    int(self.position1[1]) - int(self.position2[1]) == dct1:
-                return True
-            elif self.position1[0] == self.position2[0] and int(self.position1[1]) - int(self.position2[1]) == dct1:
-                return True
-            return False
-        elif self.chess_board[self.position2] != '  ':
-            if abs(ord(self.position2[0]) - ord(self.position1[0])) == 1 and \
-                    int(self.position1[1]) - int(self.position2[1]) == dct1:
-                return True
-            return False
-
-    def first_move_two(self, init_row, m_row, dct2):  # for white: init_row=2, next_row=3, direction=-2
-        if int(self.position1[1]) == init_row and self.chess_board[self.position2] == '  ' and \
-                self.chess_board[self.position2[0] + str(m_row)] == '  ' and \
-                self.position1[0] == self.position2[0] and int(self.position1[1]) - int(self.position2[1]) == dct2:
-            return True
-        return False
-
-    def virtual_move_results_check(self, x):
-        self.chess_board_virtual = self.chess_board.copy()  # shallow copy
-        self.chess_board_virtual[self.position2] = self.chess_board_virtual[self.position1]
-        self.chess_board_virtual[self.position1] = '  '
-        return self.king_in_check(x, self.chess_board_virtual)
-
-    # checks if xn coordinate of x player on board is under attack from enemy and returns enemy's coordinates
-    def coord_danger_from(self, xn, board, x):
-        queen_rook = self.coord_danger_from_queen_rook_bishop(
-            xn, board, x, [('z', 1, 0, -1), ('z', 8, 0, 1), ('h', 9, 1, 0), ('a', 9, -1, 0)], ('*', 'T'))
-        # check_param order: from xn checking down, up, right, left
-        if queen_rook:
-            return queen_rook
-        queen_bishop = self.coord_danger_from_queen_rook_bishop(
-            xn, board, x, [('h', 1, 1, -1), ('h', 8, 1, 1), ('a', 8, -1, 1), ('a', 1, -1, -1)], ('*', 'A'))
-        # check_param order: from xn checking right down, right up, left up, left down
-        if queen_bishop:
-            return queen_bishop
-        king = self.coord_danger_from_king_knight(xn, board, x, [(-1, -1), (0, -1), (1, -1), (-1, 0),
-                                                                 (1, 0), (-1, 1), (0, 1), (1, 1)], '+')
-        if king:
-            return king
-        knight = self.coord_danger_from_king_knight(xn, board, x, [(1, -2), (2, -1), (2, 1), (1, 2),
-                                                                   (-1, 2), (-2, 1), (-2, -1), (-1, -2)], 'f')
-        if knight:
-            return knight
-        white_pawn = self.coord_danger_from_pawn(xn, board, [(-1, -1), (1, -1)], 'w')
-        if white_pawn and x == 'b':
-            return white_pawn
-        black_pawn = self.coord_danger_from_pawn(xn, board, [(-1, 1), (1, 1)], 'b')
-        if black_pawn and x == 'w':
-            return black_pawn
-
-    @staticmethod
-    def coord_danger_from_queen_rook_bishop(xn, board, x, check_param, pieces):
-
-        def hor_vrt_dia_check(limit_col, limit_row, dct_c, dct_r):  # universal horizontal, vertical, diagonal
-            if xn[0] != limit_col and int(xn[1]) != limit_row:
-                checked_coordinate = chr(ord(xn[0]) + dct_c) + str(int(xn[1]) + dct_r)
-                reached_edge = False
-                while board[checked_coordinate] == '  ' and not reached_edge:
-                    if checked_coordinate[0] != limit_col and int(checked_coordinate[1]) != limit_row:
-                        checked_coordinate = chr(ord(checked_coordinate[0]) + dct_c) + \
-                                             str(int(checked_coordinate[1]) + dct_r)
-                    else:
-                        reached_edge = True
-                if board[checked_coordinate] != '  ':
-                    threat_coordinates.append(checked_coordinate)
-
-        threat_coordinates = []
-        for k in range(len(check_param)):
-            hor_vrt_dia_check(*check_param[k])
-        attacker = None
-        for cur, oth in [('w', 'b'), ('b', 'w')]:
-            if x == cur:
-                for i in threat_coordinates:
-                    if board[i] == oth + pieces[0]:
-                        attacker = i
-                if not attacker:
-                    for i in threat_coordinates:
-                        if board[i] == oth + pieces[1]:
-                            attacker = i
-        return attacker
-
-    def coord_danger_from_king_knight(self, xn, board, x, xy, piece):
-        possible_coordinates = [chr(ord(xn[0]) + a) + str(int(xn[1]) + b) for a, b in xy]
-        threat_coordinates = list(set(possible_coordinates).intersection(set(self.chess_board_keys)))
-        if x == 'w':
-            for i in threat_coordinates:
-                if board[i] == 'b' + piece:
-                    return i
-        elif x == 'b':
-            for i in threat_coordinates:
-                if board[i] == 'w' + piece:
-                    return i
-
-    def coord_danger_from_pawn(self, xn, board, xy, color):
-        possible_coordinates = [chr(ord(xn[0]) + a) + str(int(xn[1]) + b) for a, b in xy]
-        threat_coordinates = list(set(possible_coordinates).intersection(set(self.chess_board_keys)))
-        for i in threat_coordinates:
-            if board[i] == color + 'i':
-                return i
-
-    def move_danger_from_en_passant(self, board):
-        def check(cur, pos1, pos2, oth):
-            if board[self.position1] == cur and self.position1[1] == pos1 and self.position2[1] == pos2:
-                possible_coordinates = [chr(ord(self.position2[0]) + a) + self.position2[1] for a in [1, -1]]
-                threat_coordinates = list(set(possible_coordinates).intersection(set(self.chess_board_keys)))
-                for i in threat_coordinates:
-                    if board[i] == oth:
-                        return i
-        attacker = check('wi', '2', '4', 'bi')
-        if not attacker:
-            attacker = check('bi', '7', '5', 'wi')
-        return attacker
-
-    def check_if_game_still_going(self, x):
-        if self.currently_selected.get() != 'exit':
-            legal_move = self.legal_move_possible(x)  # to prevent running the method twice
-            all_player_pos = {self.chess_board[i]: i for i in self.chess_board_keys if self.chess_board[i] != '  '}
-            if not legal_move and self.king_in_check(x, self.chess_board):  # checkmate
-                self.game_still_going = False
-                self.winner = self.other_player
-            elif not legal_move:  # stalemate
-                self.game_still_going = False
-            # other stalemates:
-            elif {'w+', 'b+'} == set(all_player_pos):
-                self.game_still_going = False  # only king - king left
-            elif {'w+', 'b+', 'wA'} == set(all_player_pos) or {'w+', 'b+', 'bA'} == set(all_player_pos):
-                self.game_still_going = False  # only king - king+bishop left
-            elif {'w+', 'b+', 'wf'} == set(all_player_pos) or {'w+', 'b+', 'bf'} == set(all_player_pos):
-                self.game_still_going = False  # only king - king+knight left
-            elif {'w+', 'b+', 'wA', 'bA'} == set(all_player_pos) and \
-                    self.pos_map_color(all_player_pos['wA']) == self.pos_map_color(all_player_pos['bA']):
-                self.game_still_going = False  # only king+bishop - king+bishop left, with bishops on same color
-            if self.chess_board == self.previous_12_board['4ago'] and \
-                    self.chess_board == self.previous_12_board['8ago'] and \
-                    self.chess_board == self.previous_12_board['12ago']:
-                self.game_still_going = False   # the same board repeated for 3x times
-            for a, b in list(zip([i for i in range(12, 1, -1)], [i for i in range(11, 0, -1)])):    # (12, 11) to (2, 1)
-                self.previous_12_board[str(a) + 'ago'] = self.previous_12_board[str(b) + 'ago'].copy()
-            self.previous_12_board['1ago'] = self.chess_board.copy()
-
-    def legal_move_possible(self, x):
-        current_player_positions = [i for i in self.chess_board_keys if self.chess_board[i][0] == x]
-        for self.position1 in current_player_positions:
-            for self.position2 in self.chess_board_keys:
-                if self.chess_board[self.position2] not in [x + 'T', x + 'f', x + 'A', x + '+', x + '*', x + 'i'] and \
-                        self.check_legal_move() and not self.virtual_move_results_check(x):
-                    return True
-        return False
-
-    def king_in_check(self, x, board):
-        king_position = None
-        for i in self.chess_board_keys:
-            if board[i] == x + '+':
-                king_position = i
-        if self.coord_danger_from(king_position, board, x):
-            return True
-        return False
-
     def ask_for_new_game(self):
-        if self.currently_selected.get() != 'exit':
-            if self.winner == 'w':
-                message = 'White wins the game.'
-            elif self.winner == 'b':
-                message = 'Black wins the game.'
-            else:
-                message = 'The game is a draw.'
-            start_new_game = tk.messagebox.askyesno(title='End of game', message=message, detail='Start new game?')
-            if not start_new_game:
-                print('Exiting chess')
-                self.start_new_game = False
-                self.master.destroy()
-            else:
-                print('Setting up new game')
-                self.file_to_load = 'initial_setup.txt'
+        if self.state != 'over':  # a new game or file was opened while the last move was still shown
+            return
+        if self.winner == 'w':
+            message = 'White wins the game.'
+        elif self.winner == 'b':
+            message = 'Black wins the game.'
+        else:
+            message = 'The game is a draw.'
+        start_new_game = tk.messagebox.askyesno(title='End of game', message=message, detail='Start new game?')
+        if not start_new_game:
+            print('Exiting chess')
+            self.close()
+        else:
+            print('Setting up new game')
+            self.save_backup()
+            self.file_to_load = 'initial_setup.txt'
+            self.start_game()
+
+    def close(self):
+        self.engine.close()  # stops the helper processes and frees the shared hash table
+        if self.book is not None:
+            self.book.close()
+        self.master.quit()  # the menu's root window may still run the tk loop
+        self.master.destroy()
 
 
 instructions_text = """Instructions:\n
@@ -1332,14 +875,16 @@ number of player preference is also loaded. With selecting the New Game option y
 or man-man modes. Selecting the first one also prompts to chose the man's piece color. The single/dual player mode can \
 be changed during gameplay, always taking effect from the next turn.\nTo select a piece, click on it with left mouse \
 button, to deselect it, right click or hit Esc. For castling, right click on the rook which will be involved in \
-castling. Note that castling will not be offered if the selected rook or it's king moved already.\nThe game supports \
+castling. Note that castling is only offered when it is legal: the rook and it's king have not moved, the squares \
+between them are empty and the king is not in check, nor passes or lands on an attacked square.\nThe game supports \
 special moves like en-passant or pawn promotion. If one of the pawn reaches 8th rank, an option will be offered to \
 replace it.\nAt any time during the game you can access New/Load/Save Game from File Menu.\nThe Options/Settings \
-Menu let's you to change number of player and if the legal move squares to be highlighted or not.\nDuring gameplay \
-there can be warning messages in case the king is left in check.\nAt the end the winner color or draw is displayed \
-and a new game is offered.\nIt's time to Get More Freedom!\nCopyright by Csaba Bai ©2020-2021"""
+Menu let's you to change number of player and if the legal move squares to be highlighted or not.\nOnly pieces with \
+a legal move can be selected, and only squares which don't leave the king in check are offered.\nAt the end the \
+winner color or draw is displayed and a new game is offered.\nIt's time to Get More Freedom!\n\
+Copyright by Csaba Bai ©2020-2021"""
 
 if __name__ == '__main__':
     root = tk.Tk()
     GameWindow(root, (1024, 576), 'initial_setup.txt', {})
-    # root.mainloop()
+    root.mainloop()
@@ -0,0 +1,243 @@
+"""Staged legal move generation for Position.
+
+A move is an int: from square | to square << 6 | promotion piece kind << 12 (0 if none), so it fits in 16 bits.
+"""
+import threading
+from collections import OrderedDict
+from chess_bitboard import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, FULL, RANK_1, RANK_8, \
+    rook_attacks_from, bishop_attacks_from, squares
+from chess_position import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY, PAWN_PUSH, PAWN_START_RANK, EP_RANK, \
+    ROOK_RAYS, BISHOP_RAYS, SQUARE_NAMES, WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, \
+    BLACK_QUEENSIDE
+
+PROMOTION_KINDS = (QUEEN, ROOK, BISHOP, KNIGHT)
+PROMOTION_LETTERS = {KNIGHT: 'n', BISHOP: 'b', ROOK: 'r', QUEEN: 'q'}
+# (right, king from, king to, rook from, rook to, squares to be empty, squares the king passes)
+CASTLING_MOVES = [
+    [(WHITE_KINGSIDE, 4, 6, 7, 5, (5, 6), (4, 5, 6)), (WHITE_QUEENSIDE, 4, 2, 0, 3, (1, 2, 3), (4, 3, 2))],
+    [(BLACK_KINGSIDE, 60, 62, 63, 61, (61, 62), (60, 61, 62)),
+     (BLACK_QUEENSIDE, 60, 58, 56, 59, (57, 58, 59), (60, 59, 58))]]
+
+
+def _between_table():  # squares strictly between two squares on a common line, 0 if not on a line
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for ray in ROOK_RAYS[sq] + BISHOP_RAYS[sq]:
+            between = 0
+            for target in ray:
+                table[sq][target] = between
+                between |= 1 << target
+    return table
+
+
+BETWEEN = _between_table()
+
+
+def encode_move(frm, to, promotion=0):
+    return frm | to << 6 | promotion << 12
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def move_name(move):  # coordinate notation like 'e2e4' or 'e7e8q'
+    name = SQUARE_NAMES[move & 63] + SQUARE_NAMES[move >> 6 & 63]
+    if move >> 12:
+        name += PROMOTION_LETTERS[move >> 12]
+    return name
+
+
+def _attacked(position, sq, enemy, occupied):  # like Position.attackers_to, but with a custom occupancy
+    bb = position.bitboards
+    c = enemy << 3
+    return (KNIGHT_ATTACKS[sq] & bb[c | KNIGHT]) or (KING_ATTACKS[sq] & bb[c | KING]) or \
+        (PAWN_ATTACKS[enemy ^ 1][sq] & bb[c | PAWN]) or \
+        (rook_attacks_from(sq, occupied) & (bb[c | ROOK] | bb[c | QUEEN])) or \
+        (bishop_attacks_from(sq, occupied) & (bb[c | BISHOP] | bb[c | QUEEN]))
+
+
+def _pins(position, king, color):
+    """Map of pinned square -> bitboard of the line it may still move on."""
+    bb = position.bitboards
+    c = (color ^ 1) << 3
+    own = position.occupied[color]
+    occupied = own | position.occupied[color ^ 1]
+    snipers = (rook_attacks_from(king, position.occupied[color ^ 1]) & (bb[c | ROOK] | bb[c | QUEEN])) | \
+        (bishop_attacks_from(king, position.occupied[color ^ 1]) & (bb[c | BISHOP] | bb[c | QUEEN]))
+    pins = {}
+    for sniper in squares(snipers):
+        blockers = BETWEEN[king][sniper] & occupied
+        if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+            pins[blockers.bit_length() - 1] = BETWEEN[king][sniper] | 1 << sniper
+    return pins
+
+
+def legal_moves(position, captures_only=False):
+    """Yields the legal moves of the side to move: captures and promotions first, then quiet moves."""
+    color = position.side
+    enemy = color ^ 1
+    bb = position.bitboards
+    c = color << 3
+    own = position.occupied[color]
+    opponent = position.occupied[enemy]
+    occupied = own | opponent
+    king = (bb[c | KING] & -bb[c | KING]).bit_length() - 1
+    if king < 0:
+        return
+    checkers = position.attackers_to(king, enemy)
+    if checkers & (checkers - 1):  # double check, only the king can move
+        check_mask = 0
+    elif checkers:
+        checker = checkers.bit_length() - 1
+        check_mask = checkers | BETWEEN[king][checker]
+    else:
+        check_mask = FULL
+    pins = _pins(position, king, color) if check_mask else {}
+    promotion_rank = RANK_8 if color == 0 else RANK_1
+    push = PAWN_PUSH[color]
+    ep = position.ep if position.ep >= 0 and position.ep // 8 == EP_RANK[color] else -1
+    without_king = occupied ^ 1 << king
+
+    for capture_stage in ((True,) if captures_only else (True, False)):
+        stage_targets = opponent if capture_stage else ~occupied & FULL
+        if check_mask:
+            # pawns
+            for frm in squares(bb[c | PAWN] & ~promotion_rank):
+                line = pins.get(frm, FULL) & check_mask
+                targets = 0
+                to = frm + push
+                if capture_stage:
+                    targets = PAWN_ATTACKS[color][frm] & opponent & line
+                    if (1 << to) & promotion_rank and position.board[to] == EMPTY and (1 << to) & line:
+                        targets |= 1 << to  # pushes to the last rank belong to the first stage
+                else:
+                    if position.board[to] == EMPTY and not (1 << to) & promotion_rank:
+                        if (1 << to) & line:
+                            targets |= 1 << to
+                        two = to + push
+                        if frm // 8 == PAWN_START_RANK[color] and position.board[two] == EMPTY and (1 << two) & line:
+                            targets |= 1 << two
+                for to in squares(targets):
+                    if (1 << to) & promotion_rank:
+                        for kind in PROMOTION_KINDS:
+                            yield frm | to << 6 | kind << 12
+                    else:
+                        yield frm | to << 6
+                if capture_stage and ep >= 0 and (1 << ep) & PAWN_ATTACKS[color][frm] and \
+                        not position.leaves_king_in_check(frm, ep):
+                    yield frm | ep << 6
+            # pieces
+            for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+                for frm in squares(bb[c | kind]):
+                    if kind == KNIGHT:
+                        attacks = KNIGHT_ATTACKS[frm]
+                    elif kind == BISHOP:
+                        attacks = bishop_attacks_from(frm, occupied)
+                    elif kind == ROOK:
+                        attacks = rook_attacks_from(frm, occupied)
+                    else:
+                        attacks = rook_attacks_from(frm, occupied) | bishop_attacks_from(frm, occupied)
+                    for to in squares(attacks & stage_targets & check_mask & pins.get(frm, FULL)):
+                        yield frm | to << 6
+        # king
+        for to in squares(KING_ATTACKS[king] & stage_targets):
+            if not _attacked(position, to, enemy, without_king):
+                yield king | to << 6
+        if not capture_stage and not checkers:
+            for right, king_from, king_to, rook_from, rook_to, empty, passes in CASTLING_MOVES[color]:
+                if position.castling & right and king == king_from and position.board[rook_from] == c | ROOK and \
+                        all(position.board[sq] == EMPTY for sq in empty) and \
+                        not any(_attacked(position, sq, enemy, occupied) for sq in passes):
+                    yield king_from | king_to << 6
+
+
+def any_legal_move(position):
+    for _ in legal_moves(position):
+        return True
+    return False
+
+
+class MoveCache:
+    """Least recently used cache of the full legal move list of positions, keyed by their Zobrist key.
+
+    Every change of a position changes its key, so a changed board is never answered from the cache.
+    The lock lets the gui and the engine thread share one cache.
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def moves(self, position):
+        """Tuple of the legal moves of position, in the order of legal_moves."""
+        key = position.key
+        with self.lock:
+            moves = self.entries.get(key)
+            if moves is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return moves
+            self.misses += 1
+        moves = tuple(legal_moves(position))
+        with self.lock:
+            self.entries[key] = moves
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return moves
+
+
+MOVE_CACHE = MoveCache()  # shared by the game window and the engine
+
+
+def is_legal(position, move):
+    """Cheap check of a move from another source (like a hash table), castling moves are not accepted."""
+    frm, to, promotion = move & 63, move >> 6 & 63, move >> 12
+    board = position.board
+    piece = board[frm]
+    if piece == EMPTY or piece >> 3 != position.side or (board[to] != EMPTY and board[to] >> 3 == position.side):
+        return False
+    last_rank = (1 << to) & (RANK_8 | RANK_1) and piece & 7 == PAWN
+    if bool(promotion) != bool(last_rank) or not position.can_reach(frm, to):
+        return False
+    return not position.leaves_king_in_check(frm, to)
+
+
+def insufficient_material(position):
+    """Same dead positions as the game window: K-K, K+minor piece-K and K+B-K+B with bishops on one color."""
+    bb = position.bitboards
+    if any(bb[c << 3 | kind] for c in (0, 1) for kind in (PAWN, ROOK, QUEEN)):
+        return False
+    minors = [sq for c in (0, 1) for kind in (KNIGHT, BISHOP) for sq in squares(bb[c << 3 | kind])]
+    if len(minors) <= 1:
+        return True
+    if len(minors) == 2 and bb[BISHOP] and bb[8 | BISHOP]:
+        a, b = minors
+        return (a // 8 + a % 8) % 2 == (b // 8 + b % 8) % 2
+    return False
+
+
+def game_result(position):
+    """('1-0' / '0-1' / '1/2-1/2', reason) if the game is over in position, else None."""
+    if not any_legal_move(position):
+        if position.in_check(position.side):
+            return ('0-1' if position.side == 0 else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    if insufficient_material(position):
+        return '1/2-1/2', 'insufficient material'
+    if position.repetition_count() >= 3:
+        return '1/2-1/2', 'threefold repetition'
+    if position.halfmove >= 100:
+        return '1/2-1/2', 'fifty move rule'
+    return None
@@ -0,0 +1,101 @@
+"""Lazy SMP: helper processes search the same position and share what they find through one hash table.
+
+The table lives in a shared memory block that every process maps, so a helper's entries cut off and order
+the main search. Helpers start at alternating depths to spread over the tree, and stop when the main search
+sets the shared abort event.
+"""
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from chess_engine import Engine, MAX_DEPTH
+from chess_transposition import TranspositionTable
+
+_helper = None  # engine of a helper process, set up by _start_helper
+
+
+def _start_helper(memory_name, abort, max_depth, bitbases):
+    global _helper
+    memory = shared_memory.SharedMemory(name=memory_name)
+    _helper = Engine(max_depth=max_depth, tt=TranspositionTable(buffer=memory.buf), abort=abort, bitbases=bitbases)
+    _helper.memory = memory  # keeps the block mapped while the process lives
+
+
+def _helper_search(position, time_limit, first_depth, age):
+    _helper.tt.age = age  # entries of this search get the same age in every process
+    completed = []  # an iteration cut by the abort is not trusted, unlike in the main search
+    result = _helper.search(position, time_limit=time_limit, first_depth=first_depth, on_iteration=completed.append)
+    return completed[-1]._replace(nodes=result.nodes) if completed else result._replace(depth=0)
+
+
+def cpu_count():
+    return os.cpu_count() or 1
+
+
+class ParallelEngine:
+    """Engine with the same search interface that runs workers - 1 helper processes beside its own search.
+
+    With one worker no process is started. The pool is started on the first search and restarted when the
+    number of workers was changed since.
+    """
+
+    def __init__(self, workers=1, time_limit=1.0, max_depth=MAX_DEPTH, hash_mb=16, node_limit=0, bitbases=True):
+        self.workers = workers
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.bitbases = bitbases
+        self.memory = shared_memory.SharedMemory(create=True, size=hash_mb * 1024 * 1024)
+        self.tt = TranspositionTable(buffer=self.memory.buf)
+        self.tt.clear()
+        self.context = multiprocessing.get_context('spawn')  # forking a process with a running tk is unsafe
+        self.abort = self.context.Event()
+        self.main = Engine(time_limit=time_limit, max_depth=max_depth, node_limit=node_limit, tt=self.tt,
+                           abort=self.abort, bitbases=bitbases)  # the node limit counts the main search only
+        self.pool = None
+        self.pool_size = 0
+
+    def start_pool(self):
+        self.stop_pool()
+        self.pool_size = self.workers - 1
+        if self.pool_size > 0:
+            self.pool = self.context.Pool(self.pool_size, initializer=_start_helper,
+                                          initargs=(self.memory.name, self.abort, self.max_depth, self.bitbases))
+
+    def stop_pool(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.pool_size = 0
+
+    def stop(self):
+        self.main.stop()
+        self.abort.set()
+
+    def search(self, position, time_limit=None, on_iteration=None):
+        """Best move of the main search, or of a helper that completed a deeper iteration."""
+        if self.pool_size != max(self.workers - 1, 0):
+            self.start_pool()
+        if time_limit is None:
+            time_limit = self.time_limit
+        self.abort.clear()
+        self.main.time_limit = time_limit
+        # the pool pickles the arguments in its own thread, while the main search already moves on position
+        pending = [self.pool.apply_async(_helper_search, (position.copy(), time_limit, 1 + (i + 1) % 2, self.tt.age))
+                   for i in range(self.pool_size)]
+        result = self.main.search(position, time_limit, on_iteration)
+        self.abort.set()  # the main search decides when the helpers are done
+        nodes = result.nodes
+        for job in pending:
+            helper_result = job.get()
+            nodes += helper_result.nodes
+            if helper_result.depth > result.depth and helper_result.move:
+                result = result._replace(move=helper_result.move, score=helper_result.score,
+                                         depth=helper_result.depth)
+        return result._replace(nodes=nodes)
+
+    def close(self):
+        self.stop_pool()
+        self.tt.release()
+        self.main.tt = None
+        self.memory.close()
+        self.memory.unlink()
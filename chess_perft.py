@@ -0,0 +1,122 @@
+"""Perft: counts the leaf nodes of the legal move tree, to check and time the rules code without tkinter.
+
+    python chess_perft.py                  all reference positions at their default depth
+    python chess_perft.py --depth 5 start  one position, deeper
+    python chess_perft.py --fen "..." --depth 3 --divide
+"""
+import argparse
+import sys
+import time
+from chess_position import Position, START_FEN
+from chess_movegen import legal_moves, move_name
+from chess_game import Game
+
+# name: (fen, default depth, {depth: leaf nodes}), from the chessprogramming wiki and Martin Sedlak's test set
+REFERENCE_POSITIONS = {
+    'start': (START_FEN, 4, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', 3,
+                 {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    'position3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', 4, {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    'position4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', 3,
+                  {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    'position5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', 3, {1: 44, 2: 1486, 3: 62379}),
+    'position6': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', 3,
+                  {1: 46, 2: 2079, 3: 89890}),
+    'illegal_ep_move': ('3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1', 6, {6: 1134888}),
+    'illegal_ep_move2': ('8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1', 6, {6: 1015133}),
+    'ep_capture_checks': ('8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1', 6, {6: 1440467}),
+    'short_castling_check': ('5k2/8/8/8/8/8/8/4K2R w K - 0 1', 6, {6: 661072}),
+    'long_castling_check': ('3k4/8/8/8/8/8/8/R3K3 w Q - 0 1', 6, {6: 803711}),
+    'castling_rights': ('r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1', 4, {4: 1274206}),
+    'castling_prevented': ('r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1', 4, {4: 1720476}),
+    'promote_out_of_check': ('2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1', 6, {6: 3821001}),
+    'discovered_check': ('8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1', 5, {5: 1004658}),
+    'promote_to_check': ('4k3/1P6/8/8/8/8/K7/8 w - - 0 1', 6, {6: 217342}),
+    'underpromote_to_check': ('8/P1k5/K7/8/8/8/8/8 w - - 0 1', 6, {6: 92683}),
+    'self_stalemate': ('K1k5/8/P7/8/8/8/8/8 w - - 0 1', 6, {6: 2217}),
+    'stalemate_checkmate': ('8/k1P5/8/1K6/8/8/8/8 w - - 0 1', 7, {7: 567584}),
+    'stalemate_checkmate2': ('8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1', 4, {4: 23527}),
+}
+
+
+def perft(position, depth):
+    """Number of move sequences of length depth, the moves of the last ply are counted, not played."""
+    if depth <= 1:
+        return sum(1 for _ in legal_moves(position)) if depth == 1 else 1
+    nodes = 0
+    for move in list(legal_moves(position)):
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(move)
+    return nodes
+
+
+def divide(position, depth):
+    """Leaf nodes under each root move, to find the move where two move generators disagree."""
+    counts = {}
+    for move in list(legal_moves(position)):
+        position.make_move(move)
+        counts[move_name(move)] = perft(position, depth - 1)
+        position.unmake_move(move)
+    return counts
+
+
+def setup_position(path='initial_setup.txt'):
+    """Position of a save file, read by the game itself, so side to move, castling and en passant are the same."""
+    game = Game()
+    game.read_board_setup(path)
+    return game.chess_board
+
+
+def run(name, position, depth, expected=None):
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    seconds = time.perf_counter() - start
+    if expected is None:
+        verdict = ''
+    elif nodes == expected:
+        verdict = 'ok'
+    else:
+        verdict = f'FAILED, expected {expected}'
+    print(f'{name:24} depth {depth}  {nodes:>10} nodes  {seconds:8.2f}s  {nodes / max(seconds, 1e-9):>9.0f} nodes/s  '
+          + verdict)
+    return expected is None or nodes == expected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count leaf nodes of the legal move tree and time it.')
+    parser.add_argument('positions', nargs='*', help='names of reference positions (default: all of them), '
+                                                     'or a save file like initial_setup.txt')
+    parser.add_argument('--depth', type=int, help='depth instead of the default of each position')
+    parser.add_argument('--fen', help='count the moves of this position instead')
+    parser.add_argument('--divide', action='store_true', help='print the count under each root move')
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        jobs = [('fen', Position.from_fen(args.fen), args.depth or 3, None)]
+    else:
+        jobs = []
+        for name in args.positions or ['initial_setup.txt'] + list(REFERENCE_POSITIONS):
+            if name in REFERENCE_POSITIONS:
+                fen, depth, counts = REFERENCE_POSITIONS[name]
+                depth = args.depth or depth
+                jobs.append((name, Position.from_fen(fen), depth, counts.get(depth)))
+            else:  # a save file, checked against the standard counts if it holds the start position
+                depth = args.depth or REFERENCE_POSITIONS['start'][1]
+                jobs.append((name, setup_position(name), depth, None))
+    all_ok = True
+    start = time.perf_counter()
+    for name, position, depth, expected in jobs:
+        if args.divide:
+            for move, nodes in sorted(divide(position, depth).items()):
+                print(f'{move}: {nodes}')
+        if name.endswith('.txt') and position.fen() == Position.from_fen(START_FEN).fen():
+            expected = REFERENCE_POSITIONS['start'][2].get(depth)
+        all_ok = run(name, position, depth, expected) and all_ok
+    seconds = time.perf_counter() - start
+    print(f'total {seconds:.2f}s, ' + ('all counts match' if all_ok else 'SOME COUNTS DO NOT MATCH'))
+    return 0 if all_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Standard algebraic notation, PGN output of games and a streaming PGN reader.
+
+read_games goes through a file one game at a time, so a database of any size is read with constant memory, and the
+moves of a game are only parsed (movetext_tokens, parse_san) for the games that are wanted.
+"""
+import re
+from chess_position import PAWN, KING, EMPTY, SQUARE_INDEX, SQUARE_NAMES
+from chess_movegen import legal_moves, any_legal_move
+
+SAN_LETTERS = {2: 'N', 3: 'B', 4: 'R', 5: 'Q', 6: 'K'}  # piece kind -> letter, pawns have none
+SAN_KINDS = {letter: kind for kind, letter in SAN_LETTERS.items()}
+SAN_PATTERN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+TAG_PATTERN = re.compile(r'\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+
+def san(position, move):
+    """Move in standard algebraic notation like 'Nbd7', 'exd6', 'e8=Q+' or 'O-O#', for the side to move."""
+    frm, to, promotion = move & 63, move >> 6 & 63, move >> 12
+    board = position.board
+    kind = board[frm] & 7
+    if kind == KING and (to - frm == 2 or frm - to == 2):
+        text = 'O-O' if to > frm else 'O-O-O'
+    elif kind == PAWN:
+        text = SQUARE_NAMES[frm][0] + 'x' if frm % 8 != to % 8 else ''  # pawns capture, en passant too, to the side
+        text += SQUARE_NAMES[to]
+        if promotion:
+            text += '=' + SAN_LETTERS[promotion]
+    else:
+        rivals = [other & 63 for other in legal_moves(position)
+                  if other >> 6 & 63 == to and other & 63 != frm and board[other & 63] & 7 == kind]
+        text = SAN_LETTERS[kind]
+        if rivals:
+            if all(rival % 8 != frm % 8 for rival in rivals):
+                text += SQUARE_NAMES[frm][0]
+            elif all(rival // 8 != frm // 8 for rival in rivals):
+                text += SQUARE_NAMES[frm][1]
+            else:
+                text += SQUARE_NAMES[frm]
+        if board[to] != EMPTY:
+            text += 'x'
+        text += SQUARE_NAMES[to]
+    position.make_move(move)
+    if position.in_check(position.side):
+        text += '+' if any_legal_move(position) else '#'
+    position.unmake_move(move)
+    return text
+
+
+def pgn_text(headers, sans, result, start_fullmove=1, black_first=False):
+    """PGN of one game: tag pairs, then the moves wrapped at 79 characters and the result."""
+    lines = [f'[{name} "{value}"]' for name, value in headers.items()]
+    lines.append('')
+    tokens = []
+    number = start_fullmove
+    for i, text in enumerate(sans):
+        white_moves = (i % 2 == 0) != black_first
+        if white_moves:
+            tokens.append(f'{number}.')
+        elif i == 0:
+            tokens.append(f'{number}...')
+        tokens.append(text)
+        if not white_moves:
+            number += 1
+    tokens.append(result)
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_san(position, text):
+    """Move of a SAN string like 'Nbd7', 'exd6', 'e8=Q+' or 'O-O' for the side to move. Raises ValueError."""
+    text = text.rstrip('+#!?')
+    if text in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+        king = position.king_square(position.side)
+        to = king + (2 if len(text) == 3 else -2)
+        candidates = [move for move in legal_moves(position) if move & 63 == king and move >> 6 & 63 == to]
+    else:
+        match = SAN_PATTERN.match(text)
+        if not match:
+            raise ValueError('not a SAN move: ' + text)
+        letter, file, rank, target, promotion = match.groups()
+        kind = SAN_KINDS[letter] if letter else PAWN
+        to = SQUARE_INDEX[target]
+        promotion = SAN_KINDS[promotion] if promotion else 0
+        candidates = [move for move in legal_moves(position)
+                      if move >> 6 & 63 == to and position.board[move & 63] & 7 == kind and move >> 12 == promotion
+                      and (not file or SQUARE_NAMES[move & 63][0] == file)
+                      and (not rank or SQUARE_NAMES[move & 63][1] == rank)]
+    if len(candidates) != 1:
+        raise ValueError(('ambiguous' if candidates else 'illegal') + ' move: ' + text)
+    return candidates[0]
+
+
+def movetext_tokens(movetext):
+    """Generates the SAN moves of a movetext, without comments, variations, NAGs, move numbers and the result.
+
+    >>> list(movetext_tokens('12.e4 e5 13. 0-0 {castled} 0-0-0 14...Nf6 (14...Nc6) $1 1-0'))
+    ['e4', 'e5', '0-0', '0-0-0', 'Nf6']
+    """
+    movetext = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', movetext)
+    depth = 0  # of the variation
+    for token in movetext.replace('(', ' ( ').replace(')', ' ) ').split():
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0 and token[0] != '$' and token not in RESULTS:
+            token = re.sub(r'^\d+\.+', '', token)  # '12.', '12...' or '12.e4', but not castling as '0-0'
+            if token and not token.isdigit():
+                yield token
+
+
+def read_games(file):
+    """Generates (tag dictionary, movetext) for every game of an open PGN file, reading it line by line."""
+    headers = {}
+    movetext = []
+    for line in file:
+        if line.startswith('%'):  # escape line
+            continue
+        if line.startswith('['):
+            if movetext:  # a tag after the moves starts the next game
+                yield headers, ''.join(movetext)
+                headers, movetext = {}, []
+            for name, value in TAG_PATTERN.findall(line):
+                headers[name] = re.sub(r'\\(.)', r'\1', value)
+        elif line.strip() or movetext:
+            movetext.append(line)
+    if headers or movetext:
+        yield headers, ''.join(movetext)
+
+
+def read_game(path, number):
+    """Tag dictionary and SAN moves of the game with the given number, counted from 1. Raises IndexError."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        for i, (headers, movetext) in enumerate(read_games(file), 1):
+            if i == number:
+                return headers, list(movetext_tokens(movetext))
+    raise IndexError(f'{path} has no game {number}')
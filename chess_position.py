@@ -0,0 +1,453 @@
+"""Chess rules on a compact array board, usable without tkinter (engine, tests, batch tools)."""
+import random
+from chess_bitboard import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, rook_attacks_from, bishop_attacks_from, lsb, \
+    squares
+
+WHITE, BLACK = 0, 1
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+COLOR_INDEX = {'w': WHITE, 'b': BLACK}
+COLOR_NAMES = ('w', 'b')
+PIECE_LETTERS = {'i': PAWN, 'f': KNIGHT, 'A': BISHOP, 'T': ROOK, '*': QUEEN, '+': KING}  # letters of the save file
+
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+
+def make_piece(color, kind):
+    return kind | color << 3  # white pieces are 1-6, black pieces 9-14
+
+
+def piece_color(piece):
+    return piece >> 3
+
+
+def piece_kind(piece):
+    return piece & 7
+
+
+LEGACY_CODES = ['  '] * 16  # piece code -> two character string of the save file, like 'wT'
+LEGACY_PIECES = {'  ': EMPTY}
+for _letter, _kind in PIECE_LETTERS.items():
+    for _color in (WHITE, BLACK):
+        LEGACY_CODES[make_piece(_color, _kind)] = COLOR_NAMES[_color] + _letter
+        LEGACY_PIECES[COLOR_NAMES[_color] + _letter] = make_piece(_color, _kind)
+FEN_PIECES = {letter: make_piece(WHITE, kind) for letter, kind in zip('PNBRQK', range(PAWN, KING + 1))}
+FEN_PIECES.update({letter.lower(): piece | 8 for letter, piece in FEN_PIECES.items()})
+FEN_CODES = {piece: letter for letter, piece in FEN_PIECES.items()}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# square index = rank * 8 + file, so a1=0, h1=7, a8=56, h8=63
+FILES = 'abcdefgh'
+SQUARE_NAMES = [f + str(r) for r in range(1, 9) for f in FILES]
+SQUARE_INDEX = {name: sq for sq, name in enumerate(SQUARE_NAMES)}
+BOARD_KEYS = [f + str(r) for r in range(8, 0, -1) for f in FILES]  # order of the save file, a8 to h1
+
+
+def _targets(sq, steps):
+    f, r = sq % 8, sq // 8
+    return tuple((r + dr) * 8 + f + df for df, dr in steps if 0 <= f + df < 8 and 0 <= r + dr < 8)
+
+
+def _ray(sq, df, dr):
+    squares = []
+    f, r = sq % 8 + df, sq // 8 + dr
+    while 0 <= f < 8 and 0 <= r < 8:
+        squares.append(r * 8 + f)
+        f, r = f + df, r + dr
+    return tuple(squares)
+
+
+ROOK_RAYS = [tuple(_ray(sq, df, dr) for df, dr in [(0, -1), (0, 1), (1, 0), (-1, 0)]) for sq in range(64)]
+BISHOP_RAYS = [tuple(_ray(sq, df, dr) for df, dr in [(1, -1), (1, 1), (-1, 1), (-1, -1)]) for sq in range(64)]
+KNIGHT_TARGETS = [_targets(sq, [(1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2)])
+                  for sq in range(64)]
+KING_TARGETS = [_targets(sq, [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)])
+                for sq in range(64)]
+# squares attacked by a pawn of the given color standing on the square
+PAWN_CAPTURES = [[_targets(sq, [(-1, 1), (1, 1)]) for sq in range(64)],
+                 [_targets(sq, [(-1, -1), (1, -1)]) for sq in range(64)]]
+PAWN_PUSH = (8, -8)
+PAWN_START_RANK = (1, 6)
+EP_RANK = (5, 2)  # rank of the en passant square a pawn of the given color can capture on
+# castling rights kept when a piece leaves or arrives on the square
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[0], CASTLING_MASK[4], CASTLING_MASK[7] = 15 ^ WHITE_QUEENSIDE, 15 ^ 3, 15 ^ WHITE_KINGSIDE
+CASTLING_MASK[56], CASTLING_MASK[60], CASTLING_MASK[63] = 15 ^ BLACK_QUEENSIDE, 15 ^ 12, 15 ^ BLACK_KINGSIDE
+
+# Zobrist keys, from a fixed seed so that keys are the same in every run and process
+_zobrist_random = random.Random(20210101)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) if piece & 7 else 0 for _ in range(64)] for piece in range(16)]
+ZOBRIST_CASTLING = [0] + [_zobrist_random.getrandbits(64) for _ in range(15)]
+ZOBRIST_EP_FILES = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK = _zobrist_random.getrandbits(64)
+
+
+def castling_rights(moved_squares):
+    """Castling rights from the legacy list of squares where a king or rook arrived after moving."""
+    rights = 0
+    for flag, king, rook in [(WHITE_KINGSIDE, 'e1', 'h1'), (WHITE_QUEENSIDE, 'e1', 'a1'),
+                             (BLACK_KINGSIDE, 'e8', 'h8'), (BLACK_QUEENSIDE, 'e8', 'a8')]:
+        if king not in moved_squares and rook not in moved_squares:
+            rights |= flag
+    return rights
+
+
+class Position:
+    """Board of 64 small integer piece codes plus the state needed by the rules.
+
+    Every piece code also has a bitboard, and occupied holds one bitboard per color, so attack questions are
+    answered with a few bit operations instead of walking the rays.
+
+    It also behaves like the former board dictionary of GameWindow: position['e4'] gives and takes the two
+    character strings of the save file, and iteration yields the square names in save file order.
+    """
+    __slots__ = ('board', 'bitboards', 'occupied', 'side', 'castling', 'ep', 'halfmove', 'fullmove', 'undo', 'ply',
+                 'key', 'history', 'attacks', 'attack_sets')
+
+    def __init__(self):
+        self.board = [EMPTY] * 64
+        self.bitboards = [0] * 16  # indexed by piece code
+        self.occupied = [0, 0]  # indexed by color
+        self.side = WHITE
+        self.castling = 0
+        self.ep = -1  # square behind a pawn which just moved two, -1 if none
+        self.halfmove = 0
+        self.fullmove = 1
+        self.undo = [0] * 64  # packed undo records of make_move, grows when a deeper line is played
+        self.ply = 0
+        self.key = 0  # Zobrist key, updated with every change of the position
+        self.history = []  # keys of the previous positions, back to the last capture or pawn move
+        self.attacks = None  # per color the number of attackers of each square, kept up to date after track_attacks
+        self.attack_sets = None  # bitboard of the squares attacked by the piece on each square
+
+    @classmethod
+    def from_setup(cls, lines):
+        """Builds the board from the 'a8=bT' lines of a save file."""
+        position = cls()
+        for line in lines:
+            name, code = line.split('=')
+            position.put(SQUARE_INDEX[name], LEGACY_PIECES[code])  # the key follows every put
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Builds the position of a FEN string, the move counters may be left out. Raises ValueError."""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError('FEN needs at least 4 fields: ' + fen)
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError('FEN placement needs 8 ranks: ' + fields[0])
+        position = cls()
+        for i, row in enumerate(rows):
+            f = 0
+            for letter in row:
+                if letter.isdigit():
+                    f += int(letter)
+                elif letter in FEN_PIECES and f < 8:
+                    position.put((7 - i) * 8 + f, FEN_PIECES[letter])
+                    f += 1
+                else:
+                    raise ValueError('bad FEN rank: ' + row)
+            if f != 8:
+                raise ValueError('bad FEN rank: ' + row)
+        if fields[1] not in ('w', 'b') or fields[3] not in SQUARE_INDEX and fields[3] != '-':
+            raise ValueError('bad FEN side or en passant field: ' + fen)
+        castling = 0
+        for letter, flag in zip('KQkq', (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+            if letter in fields[2]:
+                castling |= flag
+        position.set_state(COLOR_INDEX[fields[1]], castling, SQUARE_INDEX.get(fields[3], -1))
+        if len(fields) >= 6:
+            position.halfmove = int(fields[4])
+            position.fullmove = int(fields[5])
+        return position
+
+    def fen(self):
+        rows = []
+        for r in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for sq in range(r * 8, r * 8 + 8):
+                if self.board[sq] == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += FEN_CODES[self.board[sq]]
+            rows.append(row + (str(empty) if empty else ''))
+        castling = ''.join(letter for letter, flag in zip('KQkq', (1, 2, 4, 8)) if self.castling & flag) or '-'
+        ep = SQUARE_NAMES[self.ep] if self.ep >= 0 else '-'
+        return f"{'/'.join(rows)} {COLOR_NAMES[self.side]} {castling} {ep} {self.halfmove} {self.fullmove}"
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.board = self.board.copy()
+        position.bitboards = self.bitboards.copy()
+        position.occupied = self.occupied.copy()
+        position.side = self.side
+        position.castling = self.castling
+        position.ep = self.ep
+        position.halfmove = self.halfmove
+        position.fullmove = self.fullmove
+        position.undo = self.undo.copy()
+        position.ply = self.ply
+        position.key = self.key
+        position.history = self.history.copy()
+        position.attacks = None
+        position.attack_sets = None
+        if self.attacks is not None:
+            position.attacks = [self.attacks[0].copy(), self.attacks[1].copy()]
+            position.attack_sets = self.attack_sets.copy()
+        return position
+
+    # dictionary like access with square names, used by the gui
+    def __getitem__(self, name):
+        return LEGACY_CODES[self.board[SQUARE_INDEX[name]]]
+
+    def __setitem__(self, name, code):
+        self.put(SQUARE_INDEX[name], LEGACY_PIECES[code])
+
+    def __iter__(self):
+        return iter(BOARD_KEYS)
+
+    def __len__(self):
+        return 64
+
+    def keys(self):
+        return list(BOARD_KEYS)
+
+    def __eq__(self, other):  # same piece placement
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self.board == other.board
+
+    __hash__ = None
+
+    def put(self, sq, piece):
+        old = self.board[sq]
+        mask = 1 << sq
+        if self.attacks is not None:
+            # sliders reaching sq see further or less far when it gets empty or occupied
+            sliders = self.sliders_to(sq) if (old == EMPTY) != (piece == EMPTY) else 0
+            for s in squares(sliders | (mask if old else 0)):
+                self.remove_attack_set(s)
+        if old:
+            self.bitboards[old] ^= mask
+            self.occupied[old >> 3] ^= mask
+        if piece:
+            self.bitboards[piece] |= mask
+            self.occupied[piece >> 3] |= mask
+        self.board[sq] = piece
+        self.key ^= ZOBRIST_PIECES[old][sq] ^ ZOBRIST_PIECES[piece][sq]
+        if self.attacks is not None:
+            for s in squares(sliders | (mask if piece else 0)):
+                self.add_attack_set(s)
+
+    # attack maps, updated by put once track_attacks was called, so make_move and unmake_move keep them too
+    def track_attacks(self):
+        self.attacks = [[0] * 64, [0] * 64]
+        self.attack_sets = [0] * 64
+        for s in squares(self.occupied[0] | self.occupied[1]):
+            self.add_attack_set(s)
+
+    def sliders_to(self, sq):
+        bb = self.bitboards
+        occupied = self.occupied[0] | self.occupied[1]
+        return (rook_attacks_from(sq, occupied) & (bb[ROOK] | bb[QUEEN] | bb[8 | ROOK] | bb[8 | QUEEN])) | \
+            (bishop_attacks_from(sq, occupied) & (bb[BISHOP] | bb[QUEEN] | bb[8 | BISHOP] | bb[8 | QUEEN]))
+
+    def add_attack_set(self, s):
+        piece = self.board[s]
+        kind = piece & 7
+        if kind == PAWN:
+            attacked = PAWN_ATTACKS[piece >> 3][s]
+        elif kind == KNIGHT:
+            attacked = KNIGHT_ATTACKS[s]
+        elif kind == KING:
+            attacked = KING_ATTACKS[s]
+        else:
+            occupied = self.occupied[0] | self.occupied[1]
+            attacked = 0
+            if kind != BISHOP:
+                attacked = rook_attacks_from(s, occupied)
+            if kind != ROOK:
+                attacked |= bishop_attacks_from(s, occupied)
+        self.attack_sets[s] = attacked
+        counts = self.attacks[piece >> 3]
+        for t in squares(attacked):
+            counts[t] += 1
+
+    def remove_attack_set(self, s):
+        counts = self.attacks[self.board[s] >> 3]
+        for t in squares(self.attack_sets[s]):
+            counts[t] -= 1
+        self.attack_sets[s] = 0
+
+    def danger_value(self, color, values):
+        """Sum of values[kind] of the pieces of color attacked more often than defended, needs track_attacks."""
+        mine, theirs = self.attacks[color], self.attacks[color ^ 1]
+        board = self.board
+        return sum(values[board[sq] & 7] for sq in squares(self.occupied[color]) if theirs[sq] > mine[sq])
+
+    def ep_key(self):  # the en passant square only counts if the side to move has a pawn to capture on it
+        if self.ep >= 0 and PAWN_ATTACKS[self.side ^ 1][self.ep] & self.bitboards[self.side << 3 | PAWN]:
+            return ZOBRIST_EP_FILES[self.ep & 7]
+        return 0
+
+    def compute_key(self):
+        key = ZOBRIST_CASTLING[self.castling] ^ self.ep_key()
+        if self.side:
+            key ^= ZOBRIST_BLACK
+        for sq, piece in enumerate(self.board):
+            key ^= ZOBRIST_PIECES[piece][sq]
+        return key
+
+    def set_state(self, side, castling, ep):
+        self.side = side
+        self.castling = castling
+        self.ep = ep
+        self.key = self.compute_key()
+
+    def repetition_count(self):
+        """How many times the current position occurred, counting this one (same side to move, castling, ep)."""
+        history = self.history
+        count = 1
+        for i in range(len(history) - 2, max(len(history) - self.halfmove, 0) - 1, -2):
+            if history[i] == self.key:
+                count += 1
+        return count
+
+    def commit_moves(self):
+        """Forgets the undo records of the moves played so far and the history no repetition can reach."""
+        self.ply = 0
+        if len(self.history) > self.halfmove:
+            del self.history[:len(self.history) - self.halfmove]
+
+    def king_square(self, color):
+        return lsb(self.bitboards[color << 3 | KING])
+
+    def can_reach(self, frm, to):
+        """Movement rule of the piece on frm, without checking the color of the piece on to."""
+        board = self.board
+        piece = board[frm]
+        kind = piece & 7
+        if kind == KNIGHT:
+            return to in KNIGHT_TARGETS[frm]
+        if kind == KING:
+            return to in KING_TARGETS[frm]
+        if kind == PAWN:
+            color = piece >> 3
+            if to in PAWN_CAPTURES[color][frm]:
+                return board[to] != EMPTY or (to == self.ep and to // 8 == EP_RANK[color])
+            push = PAWN_PUSH[color]
+            if board[to] != EMPTY:
+                return False
+            if to == frm + push:
+                return True
+            return frm // 8 == PAWN_START_RANK[color] and to == frm + 2 * push and board[frm + push] == EMPTY
+        rays = ()
+        if kind == ROOK or kind == QUEEN:
+            rays = ROOK_RAYS[frm]
+        if kind == BISHOP or kind == QUEEN:
+            rays += BISHOP_RAYS[frm]
+        for ray in rays:
+            for sq in ray:
+                if sq == to:
+                    return True
+                if board[sq] != EMPTY:
+                    break
+        return False
+
+    def attackers_to(self, sq, color):
+        """Bitboard of the pieces of color attacking sq."""
+        bb = self.bitboards
+        c = color << 3
+        occupied = self.occupied[0] | self.occupied[1]
+        return (KNIGHT_ATTACKS[sq] & bb[c | KNIGHT]) | (KING_ATTACKS[sq] & bb[c | KING]) | \
+            (PAWN_ATTACKS[color ^ 1][sq] & bb[c | PAWN]) | \
+            (rook_attacks_from(sq, occupied) & (bb[c | ROOK] | bb[c | QUEEN])) | \
+            (bishop_attacks_from(sq, occupied) & (bb[c | BISHOP] | bb[c | QUEEN]))
+
+    def in_check(self, color):
+        king = self.king_square(color)
+        return king >= 0 and self.attackers_to(king, color ^ 1) != 0
+
+    def make_move(self, move):
+        """Plays a move code of chess_movegen in place, taken back by unmake_move(move).
+
+        Captures, en passant, castling (the rook moves with the king) and promotion are handled. The state
+        needed to take the move back is packed into one int of the preallocated undo list, nothing is copied.
+        """
+        frm, to, promotion = move & 63, move >> 6 & 63, move >> 12
+        board = self.board
+        piece = board[frm]
+        captured = board[to]
+        if self.ply == len(self.undo):
+            self.undo.append(0)
+        self.undo[self.ply] = captured | self.castling << 4 | (self.ep + 1) << 8 | self.halfmove << 15
+        self.ply += 1
+        self.history.append(self.key)
+        self.key ^= ZOBRIST_CASTLING[self.castling] ^ self.ep_key() ^ ZOBRIST_BLACK
+        kind = piece & 7
+        color = piece >> 3
+        if kind == PAWN:
+            if to == self.ep and captured == EMPTY:
+                self.put(to - PAWN_PUSH[color], EMPTY)
+            if promotion:
+                piece = color << 3 | promotion
+        elif kind == KING and (to - frm == 2 or frm - to == 2):
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            self.put(rook_to, board[rook_from])
+            self.put(rook_from, EMPTY)
+        self.put(frm, EMPTY)
+        self.put(to, piece)
+        self.castling &= CASTLING_MASK[frm] & CASTLING_MASK[to]
+        self.ep = (frm + to) >> 1 if kind == PAWN and (to - frm == 16 or frm - to == 16) else -1
+        self.halfmove = 0 if kind == PAWN or captured else self.halfmove + 1
+        self.fullmove += color
+        self.side ^= 1
+        self.key ^= ZOBRIST_CASTLING[self.castling] ^ self.ep_key()
+
+    def unmake_move(self, move):
+        frm, to, promotion = move & 63, move >> 6 & 63, move >> 12
+        self.ply -= 1
+        record = self.undo[self.ply]
+        self.side ^= 1
+        color = self.side
+        self.fullmove -= color
+        captured = record & 15
+        self.castling = record >> 4 & 15
+        self.ep = (record >> 8 & 127) - 1
+        self.halfmove = record >> 15
+        piece = self.board[to]
+        if promotion:
+            piece = color << 3 | PAWN
+        self.put(to, captured)
+        self.put(frm, piece)
+        kind = piece & 7
+        if kind == PAWN:
+            if to == self.ep and captured == EMPTY:
+                self.put(to - PAWN_PUSH[color], (color ^ 1) << 3 | PAWN)
+        elif kind == KING and (to - frm == 2 or frm - to == 2):
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            self.put(rook_from, self.board[rook_to])
+            self.put(rook_to, EMPTY)
+        self.key = self.history.pop()
+
+    def leaves_king_in_check(self, frm, to):
+        board = self.board
+        piece, captured = board[frm], board[to]
+        color = piece >> 3
+        ep_sq = -1
+        if piece & 7 == PAWN and to == self.ep and captured == EMPTY:
+            ep_sq = to - PAWN_PUSH[color]
+            self.put(ep_sq, EMPTY)
+        self.put(to, piece)
+        self.put(frm, EMPTY)
+        check = self.in_check(color)
+        self.put(frm, piece)
+        self.put(to, captured)
+        if ep_sq >= 0:
+            self.put(ep_sq, make_piece(color ^ 1, PAWN))
+        return check
@@ -0,0 +1,181 @@
+"""Engine against engine matches without tkinter, spread over a process pool.
+
+    python chess_selfplay.py --games 1000 --time-a 0.2 --time-b 0.1 --pgn match.pgn
+    python chess_selfplay.py --games 200 --nodes-a 20000 --nodes-b 10000 --sprt 0 10
+    python chess_selfplay.py --games 100000 --time-a 0.01 --time-b 0.01 --archive match.gma
+
+Every opening (a few random moves from the start position, drawn with the seed) is played twice with the
+colors swapped. Games are written to the PGN file as they finish, and the W/D/L of engine A, the Elo
+difference and the SPRT verdict are printed and appended to the results file (one JSON object per line) after
+each game. Large runs are better kept in a binary archive, see chess_archive, than in the PGN file.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+from chess_position import Position, START_FEN
+from chess_movegen import legal_moves, game_result
+from chess_engine import Engine
+from chess_pgn import san, pgn_text
+from chess_archive import ArchiveWriter
+
+MAX_PLIES = 400  # longer games are adjudicated as draws
+
+
+def random_opening(seed, plies):
+    """Moves of a random opening, the same for the same seed."""
+    rng = random.Random(seed)
+    position = Position.from_fen(START_FEN)
+    moves = []
+    for _ in range(plies):
+        choices = list(legal_moves(position))
+        if not choices:
+            break
+        move = rng.choice(choices)
+        position.make_move(move)
+        moves.append(move)
+    return moves
+
+
+def play_game(job):
+    """Plays one game, job is (game number, opening moves, engine A settings, engine B settings, A plays white).
+
+    Returns the game number, the score of engine A (1, 0.5 or 0), the PGN text, the moves and the PGN headers.
+    """
+    number, opening, settings_a, settings_b, a_is_white = job
+    engines = [Engine(**settings_a), Engine(**settings_b)]
+    if not a_is_white:
+        engines.reverse()
+    position = Position.from_fen(START_FEN)
+    sans = []
+    moves = list(opening)
+    for move in opening:
+        sans.append(san(position, move))
+        position.make_move(move)
+    position.commit_moves()
+    outcome = game_result(position)
+    while outcome is None and len(sans) < MAX_PLIES:
+        result = engines[position.side].search(position.copy())  # an engine may add attack maps to its copy
+        sans.append(san(position, result.move))
+        moves.append(result.move)
+        position.make_move(result.move)
+        position.commit_moves()
+        outcome = game_result(position)
+    result, reason = outcome or ('1/2-1/2', 'adjudicated after %d plies' % MAX_PLIES)
+    white, black = ('A', 'B') if a_is_white else ('B', 'A')
+    headers = {'Event': 'Self-play', 'Site': '?', 'Date': time.strftime('%Y.%m.%d'), 'Round': str(number + 1),
+               'White': white, 'Black': black, 'Result': result, 'Termination': reason}
+    score_white = {'1-0': 1.0, '0-1': 0.0}.get(result, 0.5)
+    return number, score_white if a_is_white else 1.0 - score_white, pgn_text(headers, sans, result), moves, headers
+
+
+def elo_difference(wins, draws, losses):
+    """Elo difference of A over B and its 95% error margin."""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score = (wins + draws / 2.0) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if score <= 0.0 or score >= 1.0:
+        return (math.inf if score >= 1.0 else -math.inf), math.inf
+
+    def elo(s):
+        return -400.0 * math.log10(1.0 / s - 1.0)
+    margin = 1.96 * math.sqrt(variance / games)
+    low, high = max(score - margin, 1e-6), min(score + margin, 1 - 1e-6)
+    return elo(score), (elo(high) - elo(low)) / 2.0
+
+
+def sprt(wins, draws, losses, elo0, elo1, alpha=0.05, beta=0.05):
+    """Log likelihood ratio of elo1 against elo0 (normal approximation) and the verdict: 'H1', 'H0' or ''."""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, ''
+    score = (wins + draws / 2.0) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0, ''
+    s0 = 1.0 / (1.0 + 10 ** (-elo0 / 400.0))
+    s1 = 1.0 / (1.0 + 10 ** (-elo1 / 400.0))
+    llr = games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+    if llr >= math.log((1 - beta) / alpha):
+        return llr, 'H1'
+    if llr <= math.log(beta / (1 - alpha)):
+        return llr, 'H0'
+    return llr, ''
+
+
+def engine_settings(time_limit, node_limit, depth, hash_mb, attack_maps):
+    return {'time_limit': time_limit, 'node_limit': node_limit, 'max_depth': depth, 'hash_mb': hash_mb,
+            'attack_maps': attack_maps}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play engine A against engine B without a window.')
+    parser.add_argument('--games', type=int, default=100, help='number of games, rounded up to even (default 100)')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='processes (default: all)')
+    for side in ('a', 'b'):
+        parser.add_argument(f'--time-{side}', type=float, default=0.1, help=f'seconds per move of {side.upper()}')
+        parser.add_argument(f'--nodes-{side}', type=int, default=0, help=f'node limit per move of {side.upper()}')
+        parser.add_argument(f'--depth-{side}', type=int, default=64, help=f'depth limit of {side.upper()}')
+        parser.add_argument(f'--attack-maps-{side}', action='store_true',
+                            help=f'{side.upper()} evaluates with attack maps')
+    parser.add_argument('--hash', type=int, default=8, help='hash table MB of every engine (default 8)')
+    parser.add_argument('--opening-plies', type=int, default=4, help='random moves before the engines play')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random openings')
+    parser.add_argument('--pgn', default='selfplay.pgn', help='file the games are appended to')
+    parser.add_argument('--archive', help='append the games to this binary archive instead of the PGN file')
+    parser.add_argument('--results', default='selfplay.jsonl', help='file the running score is appended to')
+    parser.add_argument('--sprt', nargs=2, type=float, metavar=('ELO0', 'ELO1'),
+                        help='stop when the SPRT of elo1 against elo0 for A is decided')
+    args = parser.parse_args(argv)
+
+    settings_a = engine_settings(args.time_a, args.nodes_a, args.depth_a, args.hash, args.attack_maps_a)
+    settings_b = engine_settings(args.time_b, args.nodes_b, args.depth_b, args.hash, args.attack_maps_b)
+    jobs = []
+    for pair in range((args.games + 1) // 2):
+        opening = random_opening(args.seed * 100003 + pair, args.opening_plies)
+        jobs.append((2 * pair, opening, settings_a, settings_b, True))
+        jobs.append((2 * pair + 1, opening, settings_a, settings_b, False))
+
+    wins = draws = losses = 0
+    llr, verdict = 0.0, ''
+    with multiprocessing.Pool(max(args.workers, 1)) as pool, \
+            (ArchiveWriter(args.archive, commit_every=1) if args.archive else open(args.pgn, 'a')) as output, \
+            open(args.results, 'a') as results:
+        for number, score, text, moves, headers in pool.imap_unordered(play_game, jobs):
+            if args.archive:  # keeps which engine played which color, like the PGN headers
+                output.add(moves, headers['Result'], white=headers['White'], black=headers['Black'])
+            else:
+                output.write(text)
+                output.flush()
+            if score == 1.0:
+                wins += 1
+            elif score == 0.0:
+                losses += 1
+            else:
+                draws += 1
+            elo, margin = elo_difference(wins, draws, losses)
+            line = f'game {number + 1:5}  A: +{wins} ={draws} -{losses}  Elo {elo:+.1f} +/- {margin:.1f}'
+            if args.sprt:
+                llr, verdict = sprt(wins, draws, losses, *args.sprt)
+                line += f'  LLR {llr:.2f}' + (f'  {verdict} accepted' if verdict else '')
+            print(line, flush=True)
+            results.write(json.dumps({
+                'game': number + 1, 'white': headers['White'], 'black': headers['Black'], 'result': headers['Result'],
+                'wins': wins, 'draws': draws, 'losses': losses,
+                'elo': round(elo, 1) if math.isfinite(elo) else None,  # strict JSON has no infinity
+                'margin': round(margin, 1) if math.isfinite(margin) else None,
+                'llr': round(llr, 3) if args.sprt else None, 'verdict': verdict or None}) + '\n')
+            results.flush()
+            if verdict:
+                pool.terminate()
+                break
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Preallocated transposition table of fixed size, shared by the searches of a game."""
+
+EXACT, LOWER, UPPER = 1, 2, 3  # bound types, 0 marks an empty entry
+BUCKET_SIZE = 4  # entries probed for one key
+ENTRY_BYTES = 16  # two 64 bit words per entry: key xor data, data
+
+
+def pack_entry(move, score, depth, bound, age):
+    return move | (score + 32768) << 16 | depth << 32 | bound << 40 | age << 42
+
+
+def entry_move(data):
+    return data & 0xffff
+
+
+def entry_score(data):
+    return (data >> 16 & 0xffff) - 32768
+
+
+def entry_depth(data):
+    return data >> 32 & 0xff
+
+
+def entry_bound(data):
+    return data >> 40 & 3
+
+
+def entry_age(data):
+    return data >> 42 & 63
+
+
+class TranspositionTable:
+    """Buckets of four entries in one flat buffer, sized by a memory cap in megabytes.
+
+    An entry stores key ^ data next to data, so a torn write (from another process sharing the buffer) fails
+    the key check instead of returning wrong data. A new entry replaces, in this order, the entry of the same
+    key, an empty entry, or the entry with the lowest depth where every search of age counts as 4 plies less.
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        if buffer is None:
+            buffer = bytearray(size_mb * 1024 * 1024)
+        self.buffer = buffer
+        self.words = memoryview(buffer).cast('Q')
+        self.buckets = len(self.words) // (2 * BUCKET_SIZE)
+        self.size_mb = len(buffer) // (1024 * 1024)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0  # stores that overwrote an entry of another position
+
+    def release(self):  # a shared memory block can only be closed when no view of it is left
+        self.words.release()
+        self.words = self.buffer = None
+
+    def new_search(self):
+        self.age = (self.age + 1) & 63
+
+    def clear(self):
+        view = memoryview(self.buffer).cast('B')
+        zeros = bytes(1024 * 1024)
+        for start in range(0, len(view), len(zeros)):
+            end = min(start + len(zeros), len(view))
+            view[start:end] = zeros[:end - start]
+        self.age = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.probes = self.hits = self.stores = self.replacements = 0
+
+    def probe(self, key):
+        """Packed data stored for key, 0 if the position is not in the table."""
+        self.probes += 1
+        words = self.words
+        index = (key % self.buckets) * 2 * BUCKET_SIZE
+        for i in range(index, index + 2 * BUCKET_SIZE, 2):
+            data = words[i + 1]
+            if data and words[i] ^ data == key:
+                self.hits += 1
+                return data
+        return 0
+
+    def store(self, key, move, score, depth, bound):
+        words = self.words
+        age = self.age
+        index = (key % self.buckets) * 2 * BUCKET_SIZE
+        target = -1
+        worst = 1000
+        for i in range(index, index + 2 * BUCKET_SIZE, 2):
+            data = words[i + 1]
+            if not data:
+                if target < 0 or words[target + 1]:
+                    target, worst = i, -1000
+                continue
+            if words[i] ^ data == key:
+                if not move:
+                    move = entry_move(data)  # keep the best move of a former search of this position
+                target = i
+                break
+            value = entry_depth(data) - 4 * ((age - entry_age(data)) & 63)
+            if value < worst:
+                target, worst = i, value
+        else:
+            if words[target + 1]:
+                self.replacements += 1
+        data = pack_entry(move, score, depth, bound, age)
+        words[target] = key ^ data
+        words[target + 1] = data
+        self.stores += 1
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def hashfull(self):
+        """Permille of the first entries used by the current search, as UCI engines report it."""
+        words = self.words
+        sample = min(1000, len(words) // 2)
+        used = sum(1 for i in range(0, 2 * sample, 2) if words[i + 1] and entry_age(words[i + 1]) == self.age)
+        return used * 1000 // sample if sample else 0
+
+    def stats(self):
+        return {'size_mb': self.size_mb, 'probes': self.probes, 'hits': self.hits,
+                'hit_rate': round(self.hit_rate(), 4), 'stores': self.stores,
+                'replacements': self.replacements, 'hashfull': self.hashfull()}